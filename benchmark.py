@@ -0,0 +1,51 @@
+import argparse
+import tempfile
+
+from src.Benchmark.Benchmark import Benchmark
+from src.SyntheticData.SyntheticData import SyntheticData
+
+def parseArguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000, help='Número de usuários dos dados sintéticos')
+    parser.add_argument('--items', type=int, default=2000, help='Número de itens dos dados sintéticos')
+    parser.add_argument('--density', type=float, default=0.01,
+                        help='Fração dos pares (usuário, item) com nota nos dados sintéticos')
+    parser.add_argument('--genres', type=int, default=20, help='Número de gêneros dos dados sintéticos')
+    parser.add_argument('--targets-per-user', dest='targetsPerUser', type=int, default=10,
+                        help='Número de pares para predição por usuário')
+    parser.add_argument('--seed', type=int, default=13, help='Semente dos dados sintéticos')
+    parser.add_argument('--data-dir', dest='dataDir', default=None,
+                        help='Diretório onde os dados sintéticos são gravados, por padrão um diretório temporário')
+    parser.add_argument('--engine', default='minibatch', help='Motor de treino do recomendador colaborativo')
+    parser.add_argument('--epochs', type=int, default=50, help='Número máximo de passadas do treino colaborativo')
+    parser.add_argument('--factors', type=int, default=25, help='Número de fatores latentes')
+    parser.add_argument('--jobs', type=int, default=1, help='Número de threads ou processos do treino colaborativo')
+    parser.add_argument('--top-n', dest='topN', type=int, default=None,
+                        help='Número máximo de itens recomendados por usuário')
+    parser.add_argument('--no-trace-memory', dest='traceMemory', action='store_false',
+                        help='Não mede o pico de memória de cada etapa com o tracemalloc, que deixa as etapas mais lentas')
+    parser.add_argument('--compact-report', dest='compactReport', action='store_true',
+                        help='Compara o recomendador colaborativo compacto (float32/int32) com o padrão (float64)')
+    parser.add_argument('--output', default='-', help='Arquivo JSON com os resultados, - para a saída padrão')
+    return parser.parse_args()
+
+def main():
+    args = parseArguments()
+
+    synthetic = SyntheticData(nUsers=args.users, nItems=args.items, density=args.density, nGenres=args.genres,
+                              targetsPerUser=args.targetsPerUser, seed=args.seed)
+    dataset = {'nUsers': args.users, 'nItems': args.items, 'density': args.density, 'nGenres': args.genres,
+               'targetsPerUser': args.targetsPerUser, 'seed': args.seed}
+
+    benchmark = Benchmark(collaborativeParams={'engine': args.engine, 'nEpochs': args.epochs, 'nFactors': args.factors,
+                                               'nJobs': args.jobs},
+                          topN=args.topN, traceMemory=args.traceMemory)
+
+    with tempfile.TemporaryDirectory() as temporaryDir:
+        paths = synthetic.write(args.dataDir or temporaryDir)
+        results = benchmark.run(*paths, dataset=dataset, compareCompact=args.compactReport)
+
+    benchmark.save(results, args.output)
+
+if __name__ == '__main__':
+    main()
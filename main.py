@@ -1,34 +1,53 @@
-import sys
-import pandas as pd
+import argparse
 
-from src.CollaborativeRecommender.CollaborativeRecommender import CollaborativeRecommender
-from src.ContentRecommender.ContentRecommender import ContentRecommender
+from src.DataLoader.DataLoader import DataLoader
 from src.HybridRecommender.HybridRecommender import HybridRecommender
+from src.Instrumentation.Instrumentation import Instrumentation
+from src.OutputWriter.OutputWriter import OutputWriter
+from src.ParallelPipeline.ParallelPipeline import ParallelPipeline
+
+def parseArguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('ratings')
+    parser.add_argument('content')
+    parser.add_argument('targets')
+    parser.add_argument('--load-model', dest='loadModel', default=None,
+                        help='Diretório de um modelo colaborativo salvo, usado ao invés de treinar um novo')
+    parser.add_argument('--save-model', dest='saveModel', default=None,
+                        help='Diretório onde o modelo colaborativo treinado é salvo')
+    parser.add_argument('--content-cache', dest='contentCache', default=None,
+                        help='Diretório do cache dos dados de conteúdo corrigidos, reconstruído quando o arquivo muda')
+    parser.add_argument('--top-n', dest='topN', type=int, default=None,
+                        help='Número máximo de itens recomendados por usuário')
+    parser.add_argument('--output', dest='output', default='-',
+                        help='Destino das recomendações: - para a saída padrão, um arquivo .csv ou .csv.gz')
+    parser.add_argument('--parallel', dest='parallel', action='store_true',
+                        help='Executa os recomendadores colaborativo e baseado em conteúdo ao mesmo tempo, em processos separados')
+    parser.add_argument('--metrics-log', dest='metricsLog', default=None,
+                        help='Arquivo JSON lines com o tempo e a memória de cada etapa e a telemetria do treino, - para a saída de erros')
+    parser.add_argument('--trace-memory', dest='traceMemory', action='store_true',
+                        help='Mede o pico de memória alocada em cada etapa com o tracemalloc, que deixa as etapas mais lentas')
+    return parser.parse_args()
 
 def main():
+    args = parseArguments()
 
-    with open(sys.argv[1], 'r') as f:
-        ratings = pd.read_json(f, lines=True)
+    instrumentation = Instrumentation(enabled=args.metricsLog is not None, logPath=args.metricsLog, traceMemory=args.traceMemory)
 
-    with open(sys.argv[2], 'r') as f:
-        content = pd.read_json(f, lines=True)
-        
-    with open(sys.argv[3], 'r') as f:
-        targets = pd.read_csv(f, sep=',', engine='python')
+    dataLoader = DataLoader()
+    readContent = not (args.contentCache or args.parallel)
+    ratings, content, targets = dataLoader.read(args.ratings, args.content if readContent else None, args.targets)
 
 
-    ## Collaborative Filtering Recommender
-    training = ratings[['UserId', 'ItemId', 'Rating']].sample(frac=0.8, random_state=8)
-    validation = ratings.drop(training.index.tolist())
-    cfReccomendations = CollaborativeRecommender()
-    cfReccomendations = cfReccomendations.getPredictions(training, validation, targets, saveToFile=False, printOnConsole=False, getPredictions=True)
-
-    ## Content Based Recommender
-    cbReccomendations = ContentRecommender()
-    cbReccomendations = cbReccomendations.getPredictions(ratings, content, targets)
+    ## Collaborative Filtering and Content Based Recommenders
+    pipeline = ParallelPipeline(parallel=args.parallel, loadModel=args.loadModel, saveModel=args.saveModel, contentCache=args.contentCache,
+                                instrumentation=instrumentation)
+    cfReccomendations, cbReccomendations = pipeline.run(ratings, content if readContent else args.content, targets)
 
     ## Hybrid Recommender
-    hybridReccomendations = HybridRecommender()
-    hybridReccomendations = hybridReccomendations.getPredictions(cfReccomendations, cbReccomendations, saveToFile=False, printOnConsole=True)
+    hybridReccomendations = HybridRecommender(topN=args.topN, instrumentation=instrumentation)
+    with instrumentation, OutputWriter(args.output) as output:
+        hybridReccomendations = hybridReccomendations.getPredictions(cfReccomendations, cbReccomendations, saveToFile=False, printOnConsole=False, output=output)
 
-main()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import argparse
+
+from src.CollaborativeRecommender.CollaborativeRecommender import CollaborativeRecommender
+from src.ContentRecommender.ContentRecommender import ContentRecommender
+from src.DataLoader.DataLoader import DataLoader
+from src.RecommendationServer.RecommendationServer import RecommendationServer
+
+def parseArguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('ratings')
+    parser.add_argument('content')
+    parser.add_argument('--load-model', dest='loadModel', default=None,
+                        help='Diretório de um modelo colaborativo salvo, usado ao invés de treinar um novo')
+    parser.add_argument('--content-cache', dest='contentCache', default=None,
+                        help='Diretório do cache dos dados de conteúdo corrigidos, reconstruído quando o arquivo muda')
+    parser.add_argument('--host', default='127.0.0.1', help='Endereço onde o servidor escuta')
+    parser.add_argument('--port', type=int, default=8080, help='Porta onde o servidor escuta')
+    parser.add_argument('--cache-size', dest='cacheSize', type=int, default=10000,
+                        help='Número máximo de respostas mantidas no cache')
+    parser.add_argument('--top-k', dest='topK', type=int, default=10,
+                        help='Número de itens recomendados quando a consulta não define k')
+    return parser.parse_args()
+
+def main():
+    args = parseArguments()
+
+    dataLoader = DataLoader()
+    ratings = dataLoader.readRatings(args.ratings)
+
+    if args.loadModel:
+        collaborative = CollaborativeRecommender.loadModel(args.loadModel, mmap=False)
+    else:
+        training, validation = dataLoader.splitTrainingValidation(ratings)
+        collaborative = CollaborativeRecommender().train(training, validation)
+
+    content = ContentRecommender(cacheDir=args.contentCache).fitProfiles(ratings, args.content)
+
+    server = RecommendationServer(collaborative, content, ratings, cacheSize=args.cacheSize, defaultK=args.topK)
+    print('Servindo em http://%s:%d' % (args.host, args.port), flush=True)
+    server.run(args.host, args.port)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from ..CollaborativeRecommender.CollaborativeRecommender import CollaborativeRecommender
+from ..ContentRecommender.ContentRecommender import ContentRecommender
+from ..DataLoader.DataLoader import DataLoader
+from ..HybridRecommender.HybridRecommender import HybridRecommender
+from ..Instrumentation.Instrumentation import Instrumentation
+
+class Benchmark:
+    def __init__(self, collaborativeParams=None, topN=None, traceMemory=True):
+        """ Essa classe mede cada etapa do pipeline separadamente: leitura dos dados, treino e predição do
+            recomendador colaborativo, correção, codificação dos gêneros e similaridades do recomendador baseado em
+            conteúdo e a ordenação do recomendador híbrido. Para cada etapa são registrados o tempo e o pico de memória.
+
+        Attributes:
+        -----------
+            collaborativeParams (dict): Parâmetros passados ao CollaborativeRecommender
+
+            topN (int): Número máximo de itens recomendados por usuário no recomendador híbrido
+
+            traceMemory (bool): Se verdadeiro o pico de memória alocada em cada etapa é medido com o tracemalloc, que
+            deixa as etapas mais lentas. O pico de memória residente do processo é sempre registrado
+
+        """
+        self.collaborativeParams = collaborativeParams or {}
+        self.topN = topN
+        self.traceMemory = traceMemory
+
+    def _measure(self, name, function, *args, **kwargs):
+        """ Essa função executa uma etapa dentro de uma etapa da instrumentação, que registra o seu tempo e o seu pico
+            de memória em stages_, e retorna o seu resultado.
+        """
+        with self.instrumentation_.stage('Benchmark', name):
+            return function(*args, **kwargs)
+
+    def _runCollaborative(self, ratings, targets):
+        """ Essa função mede o treino e a predição do recomendador colaborativo.
+        """
+        training, validation = DataLoader().splitTrainingValidation(ratings)
+
+        recommender = CollaborativeRecommender(**self.collaborativeParams)
+        self._measure('collaborative.train', recommender.train, training, validation)
+
+        self.epochs_ = recommender.epochsRun_
+        self.ratingsPerSecond_ = self.epochs_ * len(training) / self.stages_[-1]['seconds']
+
+        return self._measure('collaborative.score', recommender.predict, targets, getPredictions=True)
+
+    def _runContent(self, ratings, content, targets):
+        """ Essa função mede as etapas do recomendador baseado em conteúdo, na mesma ordem de `getPredictions`.
+        """
+        recommender = ContentRecommender()
+        recommender.ratings_ = ratings
+        recommender.targets_ = targets
+        recommender.content_ = content
+
+        self._measure('content.cleaning', recommender._correctContentData)
+        self._measure('content.encoding', recommender._encodeGenres)
+
+        def similarity():
+            recommender._mergeRawData()
+            recommender._calculateGrade()
+            recommender._buildUserProfiles()
+            recommender._generateSimilarities()
+
+            return recommender.semilarities_
+
+        return self._measure('content.similarity', similarity)
+
+    def _modelBytes(self, recommender):
+        """ Essa função soma a memória dos bias e dos fatores latentes do recomendador.
+        """
+        return sum(getattr(recommender, name).nbytes for name in ['bu_', 'bi_', 'pu_', 'qi_'])
+
+    def compareCompact(self, ratings, targets):
+        """ Essa função treina o recomendador colaborativo nos modos padrão (float64) e compacto (float32/int32),
+            com os mesmos parâmetros, e compara a acurácia, a memória e o tempo dos dois.
+
+        Returns:
+        -----------
+            comparison (dict): RMSE de validação, memória do treino e do modelo e tempo de cada modo, e as diferenças
+            de RMSE e de nota predita entre eles
+
+        """
+        training, validation = DataLoader().splitTrainingValidation(ratings)
+        comparison = {}
+        predictions = {}
+
+        for mode, compact in [('float64', False), ('float32', True)]:
+            recommender = CollaborativeRecommender(**dict(self.collaborativeParams, compact=compact))
+
+            start = time.perf_counter()
+            recommender.train(training, validation)
+            seconds = time.perf_counter() - start
+
+            rmse = recommender.validationRMSE_[:recommender.epochsRun_, 0]
+            predictions[mode] = recommender.predict(targets).sort_index()['Predictions'].to_numpy(dtype=np.float64)
+
+            comparison[mode] = {
+                'validationRMSE': float(np.nanmin(rmse)),
+                'epochs': recommender.epochsRun_,
+                'trainingBytes': recommender.training_.nbytes + recommender.validation_.nbytes,
+                'modelBytes': self._modelBytes(recommender),
+                'trainSeconds': seconds,
+            }
+
+        comparison['rmseDifference'] = comparison['float32']['validationRMSE'] - comparison['float64']['validationRMSE']
+        comparison['maxPredictionDifference'] = float(np.abs(predictions['float32'] - predictions['float64']).max(initial=0))
+
+        return comparison
+
+    def _environment(self):
+        """ Essa função descreve o ambiente de execução, para que resultados de máquinas diferentes sejam comparáveis.
+        """
+        return {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpuCount': os.cpu_count(),
+        }
+
+    def run(self, ratingsPath, contentPath, targetsPath, dataset=None, compareCompact=False):
+        """ Essa função executa o pipeline completo sobre os arquivos, medindo cada etapa.
+
+        Parameters:
+        -----------
+            dataset (dict): Descrição dos dados, por exemplo os parâmetros do SyntheticData, copiada para o resultado
+
+            compareCompact (bool): Se verdadeiro o resultado inclui a comparação do modo compacto com o padrão, de
+            `compareCompact`
+
+        Returns:
+        -----------
+            results (dict): Resultado serializável em JSON com o ambiente, os dados, os parâmetros e as etapas
+
+        """
+        self.instrumentation_ = Instrumentation(traceMemory=self.traceMemory)
+        self.stages_ = self.instrumentation_.stages_
+
+        ratings, content, targets = self._measure('ingestion', DataLoader().read, ratingsPath, contentPath, targetsPath)
+
+        cfPredictions = self._runCollaborative(ratings, targets)
+        cbPredictions = self._runContent(ratings, content, targets)
+
+        hybrid = HybridRecommender(topN=self.topN)
+        self._measure('hybrid.ranking', hybrid.getPredictions, cfPredictions, cbPredictions, saveToFile=False, printOnConsole=False)
+
+        results = {
+            'environment': self._environment(),
+            'dataset': dict(dataset or {}, ratings=len(ratings), items=len(content), targets=len(targets)),
+            'params': {'collaborative': self.collaborativeParams, 'topN': self.topN, 'traceMemory': self.traceMemory},
+            'collaborative': {'epochs': self.epochs_, 'ratingsPerSecond': self.ratingsPerSecond_},
+            'stages': self.stages_,
+            'totalSeconds': sum(stage['seconds'] for stage in self.stages_),
+        }
+
+        if compareCompact:
+            results['compact'] = self.compareCompact(ratings, targets)
+
+        return results
+
+    def save(self, results, path):
+        """ Essa função grava o resultado em JSON, no arquivo ou na saída padrão quando o caminho é -.
+        """
+        if path == '-':
+            json.dump(results, sys.stdout, indent=2)
+            sys.stdout.write('\n')
+            return
+
+        with open(path, 'w') as file:
+            json.dump(results, file, indent=2)
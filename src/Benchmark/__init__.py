@@ -0,0 +1 @@
+from .Benchmark import Benchmark
\ No newline at end of file
@@ -1,8 +1,26 @@
+import inspect
+import json
+from contextlib import ExitStack
+import os
+import shutil
+import tempfile
+import time
+
 import numpy as np
 import pandas as pd
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from ..IdMapping.IdMapping import IdMapping
+from ..Instrumentation.Instrumentation import Instrumentation
+from ..OutputWriter.OutputWriter import OutputWriter
+from ..RatingShards.RatingShards import RatingShards
+from ..SharedArrays.SharedArrays import SharedArrays
+
 class CollaborativeRecommender:
-    def __init__(self, learningRate=0.01, regularizationFactor=0.05, nEpochs=50, nFactors=25, stopThreshold=0.00001):
+    def __init__(self, learningRate=0.01, regularizationFactor=0.05, nEpochs=50, nFactors=25, stopThreshold=0.00001,
+                 engine='minibatch', batchSize=1024, nJobs=1, validationFrequency=1, validationSampleSize=None,
+                 predictionBatchSize=65536, compact=False, instrumentation=None):
         """ Esse classe implementa um recomendador colaborativo baseado no modelo de fator latente utilizando da ideia
             da decomposição em valores singulares (SVD). Os valores pré-definidos na chamada da função representam
             a melhor configuração encontrada após testes.
@@ -26,6 +44,33 @@ class CollaborativeRecommender:
 
             maxRating (int): Menor nota permitida a um item
 
+            engine (str): Motor de treino dos fatores latentes. 'minibatch' atualiza bias e fatores em lotes
+            vetorizados com o NumPy, 'sgd' mantém o laço original amostra a amostra como referência
+            para comparar a acurácia, 'als' resolve os mínimos quadrados alternados em forma fechada e
+            'hogwild' divide os mini-lotes de cada passada entre nJobs processos que atualizam os mesmos
+            fatores em memória compartilhada
+
+            batchSize (int): Número de notas processadas em cada lote do motor 'minibatch'
+
+            nJobs (int): Número de threads usadas para resolver os blocos de usuários e itens no motor 'als', ou
+            de processos que treinam ao mesmo tempo no motor 'hogwild'
+
+            validationFrequency (int): O RMSE de validação é calculado, e a parada antecipada verificada, a cada
+            validationFrequency passadas
+
+            validationSampleSize (int): Se definido, o RMSE é calculado sobre uma amostra aleatória fixa com esse
+            número de notas de validação, ao invés do conjunto inteiro
+
+            predictionBatchSize (int): Número de pares (usuário, item) avaliados em cada lote no cálculo do RMSE
+            de validação e nas predições dos targets
+
+            compact (bool): Se verdadeiro as notas mapeadas são guardadas como índices int32 e notas float32, os bias
+            e fatores latentes em float32 e os mapeamentos de ids em arrays ordenados (IdMapping) ao invés de
+            dicionários, o que reduz a memória do modelo e do treino pela metade
+
+            instrumentation (Instrumentation): Registra o tempo e a memória das etapas e a telemetria de cada
+            passada do treino. Se não definida, nada é medido
+
         """
         
         self.learningRate = learningRate
@@ -33,9 +78,50 @@ class CollaborativeRecommender:
         self.nEpochs = nEpochs
         self.nFactors = nFactors
         self.stopThreshold = stopThreshold
+        self.engine = engine
+        self.batchSize = batchSize
+        self.nJobs = nJobs
+        self.validationFrequency = validationFrequency
+        self.validationSampleSize = validationSampleSize
+        self.predictionBatchSize = predictionBatchSize
+        self.compact = compact
+        self.instrumentation = instrumentation or Instrumentation.disabled()
         self.minRating = 0
         self.maxRating = 10
 
+    def _floatType(self):
+        """ Esse método retorna o tipo de ponto flutuante das notas, bias e fatores latentes.
+        """
+        return np.float32 if self.compact else np.float64
+
+    def _columns(self, dataSet):
+        """ Esse método separa as notas mapeadas em usuários, itens e notas. O formato compacto é um array
+            estruturado com os campos user, item e rating, e o padrão uma matriz float64 de três colunas.
+
+        Returns:
+        -----------
+            users (numpy array): Índices dos usuários
+
+            items (numpy array): Índices dos itens
+
+            ratings (numpy array): Notas
+
+        """
+        if dataSet.dtype.names:
+            return dataSet['user'], dataSet['item'], dataSet['rating']
+
+        return dataSet[:, 0].astype(np.int64), dataSet[:, 1].astype(np.int64), dataSet[:, 2]
+
+    def _countIds(self, dataSet):
+        """ Esse método retorna o número de usuários e de itens das notas mapeadas, ou dos shards.
+        """
+        if isinstance(dataSet, RatingShards):
+            return dataSet.metadata_['nUsers'], dataSet.metadata_['nItems']
+
+        users, items, ratings = self._columns(dataSet)
+
+        return len(np.unique(users)), len(np.unique(items))
+
     def _initBias(self, dataFrame):
         """ Esse método inicializa o vetor de bias de itens e de usuários. 
 
@@ -50,11 +136,10 @@ class CollaborativeRecommender:
             bi (array): bias dos itens, inicialmente zerados
 
         """
-        nUsers = len(np.unique(dataFrame[:, 0]))
-        nItems = len(np.unique(dataFrame[:, 1]))
+        nUsers, nItems = self._countIds(dataFrame)
 
-        bu = np.zeros(nUsers)
-        bi = np.zeros(nItems)
+        bu = np.zeros(nUsers, dtype=self._floatType())
+        bi = np.zeros(nItems, dtype=self._floatType())
 
         return bu, bi
 
@@ -74,12 +159,11 @@ class CollaborativeRecommender:
             números aleatórios gerados a partir de uma distribuição normal
 
         """
-        nUsers = len(np.unique(dataFrame[:, 0]))
-        nItems = len(np.unique(dataFrame[:, 1]))
+        nUsers, nItems = self._countIds(dataFrame)
 
         np.random.seed(seed=13)
-        pu = np.random.normal(0, .01, (nUsers, self.nFactors))
-        qi = np.random.normal(0, .01, (nItems, self.nFactors))
+        pu = np.random.normal(0, .01, (nUsers, self.nFactors)).astype(self._floatType(), copy=False)
+        qi = np.random.normal(0, .01, (nItems, self.nFactors)).astype(self._floatType(), copy=False)
 
         return pu, qi
 
@@ -94,9 +178,13 @@ class CollaborativeRecommender:
             
         Returns:
         -----------
-            mapping (dict): Dicionário para o mapeamento feito entre os dados e os seus indices inteiros
+            mapping (dict): Dicionário para o mapeamento feito entre os dados e os seus indices inteiros, ou
+            IdMapping no modo compacto
 
         """
+        if self.compact:
+            return IdMapping(np.asarray(dataFrame[columnName].unique()))
+
         userIds = dataFrame[columnName].unique().tolist()
         nUsers = len(userIds)
         userIndexes = range(nUsers)
@@ -104,6 +192,34 @@ class CollaborativeRecommender:
         mapping = dict(zip(userIds, userIndexes))
         return mapping
 
+    def _extendDataSetMapping(self, mapping, dataFrame, columnName):
+        """ Esse método acrescenta ao mapeamento os ids de uma coluna do dataset que ainda não são conhecidos,
+            com índices inteiros a partir do fim do mapeamento atual.
+
+        Parameters:
+        -----------
+            mapping (dict): Dicionário do mapeamento, atualizado no próprio dicionário
+
+            dataFrame (pandas dataframe): Dataset que contem os dados a serem mapeados
+            
+            columnName (pandas dataframe): Coluna do dataset que contem os dados a serem mapeados
+            
+        Returns:
+        -----------
+            nNewIds (int): Número de ids acrescentados ao mapeamento
+
+        """
+        if isinstance(mapping, IdMapping):
+            ids = np.asarray(dataFrame[columnName].unique())
+            newIds = ids[mapping.lookup(ids) < 0]
+            mapping.extend(newIds)
+            return len(newIds)
+
+        newIds = [id for id in dataFrame[columnName].unique().tolist() if id not in mapping]
+        mapping.update(zip(newIds, range(len(mapping), len(mapping) + len(newIds))))
+
+        return len(newIds)
+
     def _generateMappedDataset(self, dataSet):
         """ Esse método gera um novo data set com as tuplas (usuário, item, nota) com os ids dos usuários
             e dos itens convertidos para seus respectivos índices em número inteiro
@@ -114,27 +230,362 @@ class CollaborativeRecommender:
 
         Returns:
         -----------
-            mappedDataSet(numpy array): Dataset convertido para seu equivalente com ids inteiros
+            mappedDataSet(numpy array): Dataset convertido para seu equivalente com ids inteiros. No modo
+            compacto, um array estruturado com os campos user e item em int32 e rating em float32
 
         """
-        mappedDataSet = dataSet.copy()            
+        if self.compact:
+            mappedDataSet = np.empty(len(dataSet), dtype=[('user', np.int32), ('item', np.int32), ('rating', np.float32)])
+            mappedDataSet['user'] = self._mapIds(dataSet['UserId'], self.userMapping_)
+            mappedDataSet['item'] = self._mapIds(dataSet['ItemId'], self.itemMapping_)
+            mappedDataSet['rating'] = dataSet['Rating'].to_numpy()
 
-        mappedDataSet['UserId'] = mappedDataSet['UserId'].map(self.userMapping_)
-        mappedDataSet['ItemId'] = mappedDataSet['ItemId'].map(self.itemMapping_)
+            return mappedDataSet
 
-        mappedDataSet.fillna(-1, inplace=True)
+        mappedDataSet = np.empty((len(dataSet), 3))
 
-        mappedDataSet['UserId'] = mappedDataSet['UserId'].astype(np.int32)
-        mappedDataSet['ItemId'] = mappedDataSet['ItemId'].astype(np.int32)
+        mappedDataSet[:, 0] = self._mapIds(dataSet['UserId'], self.userMapping_)
+        mappedDataSet[:, 1] = self._mapIds(dataSet['ItemId'], self.itemMapping_)
+        mappedDataSet[:, 2] = dataSet['Rating'].to_numpy()
 
-        return mappedDataSet[['UserId', 'ItemId', 'Rating']].to_numpy()
+        return mappedDataSet
     
-    def _learnFactors(self):
+    def _runSGDEpoch(self, dataSet, bu, bi, pu, qi):
+        """ Esse método executa uma passada do SGD (Stochastic Gradient Descent) original, atualizando os bias
+            e os fatores latentes a cada nota do conjunto de treino. É mantido como referência de acurácia para
+            o motor em lotes.
+
+        Parameters:
+        -----------
+            dataSet (numpy array): Notas (usuário, item, nota) mapeadas usadas na passada
+
+            bu (array): Bias de usuários, atualizado no próprio array
+
+            bi (array): Bias de itens, atualizado no próprio array
+
+            pu (array): Matriz de fatores latentes para os usuários, atualizada no próprio array
+
+            qi (array): Matriz de fatores latentes para os itens, atualizada no próprio array
+
+        """
+        users, items, ratings = self._columns(dataSet)
+
+        for i in range(dataSet.shape[0]):
+            user = int(users[i])
+            item = int(items[i])
+            rating = ratings[i]
+
+            prediction = self.globalMean_ + bu[user] + bi[item]
+
+            for factor in range(self.nFactors):
+                prediction += pu[user, factor] * qi[item, factor]
+
+            error = rating - prediction
+            bu[user] += self.learningRate * (error - self.regularizationFactor * bu[user])
+            bi[item] += self.learningRate * (error - self.regularizationFactor * bi[item])
+
+            for factor in range(self.nFactors):
+                userFactor = pu[user, factor]
+                itemFactor = qi[item, factor]
+
+                pu[user, factor] += self.learningRate * (error * itemFactor - self.regularizationFactor * userFactor)
+                qi[item, factor] += self.learningRate * (error * userFactor - self.regularizationFactor * itemFactor)
+
+    def _scatterAdd(self, target, indexes, values):
+        """ Esse método soma os valores nas linhas indicadas do array alvo, acumulando as contribuições de
+            índices repetidos. Os índices são ordenados e as linhas somadas por grupo com `np.add.reduceat`,
+            o que evita o `np.add.at` elemento a elemento.
+
+        Parameters:
+        -----------
+            target (numpy array): Array que recebe as somas, atualizado no próprio array
+
+            indexes (numpy array): Linhas de target que recebem cada valor
+
+            values (numpy array): Valores a serem somados, um por índice (ou uma linha por índice)
+
+        """
+        order = np.argsort(indexes, kind='stable')
+        sortedIndexes = indexes[order]
+
+        groupStarts = np.flatnonzero(np.r_[True, sortedIndexes[1:] != sortedIndexes[:-1]])
+        target[sortedIndexes[groupStarts]] += np.add.reduceat(values[order], groupStarts, axis=0)
+
+    def _runMiniBatchEpoch(self, dataSet, bu, bi, pu, qi):
+        """ Esse método executa uma passada do SGD em mini-lotes. As notas de treino são embaralhadas e, para cada
+            lote, os erros são calculados de uma vez com produtos linha a linha entre os fatores e os gradientes
+            são acumulados nos usuários e itens do lote.
+
+        Parameters:
+        -----------
+            dataSet (numpy array): Notas (usuário, item, nota) mapeadas usadas na passada
+
+            bu (array): Bias de usuários, atualizado no próprio array
+
+            bi (array): Bias de itens, atualizado no próprio array
+
+            pu (array): Matriz de fatores latentes para os usuários, atualizada no próprio array
+
+            qi (array): Matriz de fatores latentes para os itens, atualizada no próprio array
+
+        """
+        self._runMiniBatches(dataSet, self.shuffler_.permutation(dataSet.shape[0]), bu, bi, pu, qi)
+
+    def _runMiniBatches(self, dataSet, order, bu, bi, pu, qi):
+        """ Esse método aplica o SGD em mini-lotes sobre as notas de dataSet na ordem dada por order.
+
+        Parameters:
+        -----------
+            dataSet (numpy array): Notas (usuário, item, nota) mapeadas
+
+            order (numpy array): Linhas de dataSet processadas, na ordem em que são processadas
+
+            bu (array): Bias de usuários, atualizado no próprio array
+
+            bi (array): Bias de itens, atualizado no próprio array
+
+            pu (array): Matriz de fatores latentes para os usuários, atualizada no próprio array
+
+            qi (array): Matriz de fatores latentes para os itens, atualizada no próprio array
+
+        """
+        for start in range(0, len(order), self.batchSize):
+            users, items, ratings = self._columns(dataSet[order[start:start + self.batchSize]])
+
+            userFactors = pu[users]
+            itemFactors = qi[items]
+
+            predictions = self.globalMean_ + bu[users] + bi[items] + np.einsum('ij,ij->i', userFactors, itemFactors)
+            errors = ratings - predictions
+
+            self._scatterAdd(bu, users, self.learningRate * (errors - self.regularizationFactor * bu[users]))
+            self._scatterAdd(bi, items, self.learningRate * (errors - self.regularizationFactor * bi[items]))
+
+            errors = errors[:, np.newaxis]
+            self._scatterAdd(pu, users, self.learningRate * (errors * itemFactors - self.regularizationFactor * userFactors))
+            self._scatterAdd(qi, items, self.learningRate * (errors * userFactors - self.regularizationFactor * itemFactors))
+
+    def _runShardedEpoch(self, shards, bu, bi, pu, qi):
+        """ Esse método executa uma passada sobre as notas gravadas em shards, para o treino fora da memória. A ordem
+            dos shards e a ordem das notas dentro de cada shard são embaralhadas, e cada shard é lido do disco e
+            processado pelo motor 'minibatch' ou 'sgd' antes do próximo, então apenas um shard fica em memória.
+
+        Parameters:
+        -----------
+            shards (RatingShards): Shards das notas de treino
+
+            bu (array): Bias de usuários, atualizado no próprio array
+
+            bi (array): Bias de itens, atualizado no próprio array
+
+            pu (array): Matriz de fatores latentes para os usuários, atualizada no próprio array
+
+            qi (array): Matriz de fatores latentes para os itens, atualizada no próprio array
+
+        """
+        for shard in shards.iterShards('training', self.shuffler_.permutation(shards.nShards('training'))):
+            order = self.shuffler_.permutation(len(shard))
+
+            if self.engine == 'sgd':
+                self._runSGDEpoch(shard[order], bu, bi, pu, qi)
+            else:
+                self._runMiniBatches(shard, order, bu, bi, pu, qi)
+
+    @staticmethod
+    def _runHogwildWorker(params, globalMean, descriptor, start, end):
+        """ Esse método é executado em cada processo do motor 'hogwild'. Ele mapeia os bias, os fatores e as notas
+            de treino da memória compartilhada e aplica o SGD em mini-lotes sobre a sua fatia da ordem embaralhada
+            da passada, escrevendo direto nos arrays compartilhados, sem travas.
+
+        Parameters:
+        -----------
+            params (dict): Hiperparâmetros do recomendador
+
+            globalMean (float): Média global das notas do conjunto de treino
+
+            descriptor (dict): Descriptor dos arrays compartilhados
+
+            start (int): Início da fatia da ordem embaralhada
+
+            end (int): Fim da fatia da ordem embaralhada
+
+        """
+        recommender = CollaborativeRecommender(**params)
+        recommender.globalMean_ = globalMean
+
+        shared = SharedArrays.attach(descriptor)
+
+        try:
+            recommender._runMiniBatches(shared['training'], shared['order'][start:end],
+                                        shared['bu'], shared['bi'], shared['pu'], shared['qi'])
+        finally:
+            shared.close()
+
+    def _runHogwildEpoch(self, dataSet, bu, bi, pu, qi):
+        """ Esse método executa uma passada do SGD em mini-lotes dividida entre nJobs processos, no estilo Hogwild.
+            A ordem embaralhada das notas é gravada na memória compartilhada e cada processo recebe uma fatia dela.
+            A passada termina quando todos os processos terminam, o que sincroniza os fatores para a validação. Com
+            um único processo a passada é feita no processo atual e é igual à do motor 'minibatch'.
+
+        Parameters:
+        -----------
+            dataSet (numpy array): Notas (usuário, item, nota) mapeadas usadas na passada, as mesmas
+            compartilhadas em hogwildShared_
+
+            bu (array): Bias de usuários compartilhados, atualizados no próprio array
+
+            bi (array): Bias de itens compartilhados, atualizados no próprio array
+
+            pu (array): Matriz de fatores latentes para os usuários compartilhada, atualizada no próprio array
+
+            qi (array): Matriz de fatores latentes para os itens compartilhada, atualizada no próprio array
+
+        """
+        if self.nJobs == 1:
+            return self._runMiniBatchEpoch(dataSet, bu, bi, pu, qi)
+
+        order = self.hogwildShared_['order']
+        order[:] = self.shuffler_.permutation(dataSet.shape[0])
+
+        bounds = np.linspace(0, len(order), self.nJobs + 1).astype(np.int64)
+        descriptor = self.hogwildShared_.descriptor()
+
+        futures = [self.hogwildExecutor_.submit(CollaborativeRecommender._runHogwildWorker, self._getParams(),
+                                                self.globalMean_, descriptor, bounds[job], bounds[job + 1])
+                   for job in range(self.nJobs)]
+
+        for future in futures:
+            future.result()
+
+    def _solveLeastSquaresBlock(self, rows, counts, cols, targets, colFactors, bias, factors, maxRatingsPerBlock):
+        """ Esse método resolve, para um bloco de usuários (ou itens), os sistemas de mínimos quadrados
+            regularizados que determinam o bias e os fatores latentes de cada um. As matrizes normais são
+            acumuladas em pedaços de no máximo maxRatingsPerBlock notas, que podem dividir um usuário (ou item)
+            com muitas notas, e resolvidas em lote pelo `np.linalg.solve`.
+
+        Parameters:
+        -----------
+            rows (numpy array): Índices dos usuários (ou itens) do bloco
+
+            counts (numpy array): Número de notas de cada usuário (ou item) do bloco
+
+            cols (numpy array): Itens (ou usuários) avaliados, agrupados na mesma ordem de rows
+
+            targets (numpy array): Notas descontadas da média global e do bias do outro lado
+
+            colFactors (numpy array): Fatores latentes fixos do outro lado
+
+            bias (array): Bias a ser resolvido, atualizado no próprio array
+
+            factors (array): Fatores latentes a serem resolvidos, atualizados no próprio array
+
+            maxRatingsPerBlock (int): Número máximo de notas cujos produtos externos são montados de uma vez
+
+        """
+        gram = np.zeros((len(rows), self.nFactors + 1, self.nFactors + 1), dtype=factors.dtype)
+        rhs = np.zeros((len(rows), self.nFactors + 1), dtype=factors.dtype)
+        groupStarts = np.r_[0, np.cumsum(counts)[:-1]]
+
+        for start in range(0, len(cols), maxRatingsPerBlock):
+            end = min(start + maxRatingsPerBlock, len(cols))
+            first = np.searchsorted(groupStarts, start, side='right') - 1
+            last = np.searchsorted(groupStarts, end, side='left')
+            segmentStarts = np.maximum(groupStarts[first:last], start) - start
+
+            design = np.empty((end - start, self.nFactors + 1), dtype=factors.dtype)
+            design[:, 0] = 1
+            design[:, 1:] = colFactors[cols[start:end]]
+
+            gram[first:last] += np.add.reduceat(np.einsum('ij,ik->ijk', design, design), segmentStarts, axis=0)
+            rhs[first:last] += np.add.reduceat(design * targets[start:end, np.newaxis], segmentStarts, axis=0)
+
+        diagonal = np.arange(self.nFactors + 1)
+        gram[:, diagonal, diagonal] += self.regularizationFactor * counts[:, np.newaxis]
+
+        solution = np.linalg.solve(gram, rhs[:, :, np.newaxis])[:, :, 0]
+        bias[rows] = solution[:, 0]
+        factors[rows] = solution[:, 1:]
+
+    def _solveLeastSquares(self, rows, cols, targets, colFactors, bias, factors):
+        """ Esse método resolve um lado do ALS (Alternating Least Squares). As notas são agrupadas por usuário
+            (ou item) e os grupos divididos em blocos, que são resolvidos em paralelo por `nJobs` threads. Cada
+            bloco escreve apenas em suas próprias linhas de bias e fatores, e monta as matrizes normais em pedaços
+            de no máximo maxRatingsPerBlock notas, então a memória de cada thread é limitada mesmo para um item
+            com muitas notas.
+
+        Parameters:
+        -----------
+            rows (numpy array): Usuário (ou item) de cada nota, cujo bias e fatores são resolvidos
+
+            cols (numpy array): Item (ou usuário) de cada nota, cujos fatores ficam fixos
+
+            targets (numpy array): Notas descontadas da média global e do bias do outro lado
+
+            colFactors (numpy array): Fatores latentes fixos do outro lado
+
+            bias (array): Bias a ser resolvido, atualizado no próprio array
+
+            factors (array): Fatores latentes a serem resolvidos, atualizados no próprio array
+
+        """
+        order = np.argsort(rows, kind='stable')
+        rows, cols, targets = rows[order], cols[order], targets[order]
+
+        groupStarts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        counts = np.diff(np.r_[groupStarts, len(rows)])
+
+        maxRatingsPerBlock = max(1, 2 ** 22 // (self.nFactors + 1) ** 2)
+        blockIds = groupStarts // maxRatingsPerBlock
+        blockBounds = np.r_[0, np.flatnonzero(blockIds[1:] != blockIds[:-1]) + 1, len(groupStarts)]
+
+        def solveBlock(block):
+            first, last = blockBounds[block], blockBounds[block + 1]
+            start = groupStarts[first]
+            end = groupStarts[last] if last < len(groupStarts) else len(rows)
+
+            self._solveLeastSquaresBlock(rows[groupStarts[first:last]], counts[first:last], cols[start:end],
+                                         targets[start:end], colFactors, bias, factors, maxRatingsPerBlock)
+
+        with ThreadPoolExecutor(max_workers=self.nJobs) as executor:
+            list(executor.map(solveBlock, range(len(blockBounds) - 1)))
+
+    def _runALSEpoch(self, dataSet, bu, bi, pu, qi):
+        """ Esse método executa uma passada do ALS (Alternating Least Squares). Com os itens fixos, os bias e
+            fatores de cada usuário são obtidos em forma fechada pela regressão ridge das suas notas, e em
+            seguida o mesmo é feito para os itens com os usuários fixos. A regularização de cada sistema é
+            ponderada pelo número de notas do usuário ou item, então o ALS costuma pedir um
+            `regularizationFactor` maior que o do SGD.
+
+        Parameters:
+        -----------
+            dataSet (numpy array): Notas (usuário, item, nota) mapeadas usadas na passada
+
+            bu (array): Bias de usuários, atualizado no próprio array
+
+            bi (array): Bias de itens, atualizado no próprio array
+
+            pu (array): Matriz de fatores latentes para os usuários, atualizada no próprio array
+
+            qi (array): Matriz de fatores latentes para os itens, atualizada no próprio array
+
+        """
+        users, items, ratings = self._columns(dataSet)
+        ratings = ratings - self.globalMean_
+
+        self._solveLeastSquares(users, items, ratings - bi[items], qi, bu, pu)
+        self._solveLeastSquares(items, users, ratings - bu[users], pu, bi, qi)
+
+    def _learnFactors(self, epochCallback=None):
         """ Esse método executa uma versão da ideia do SGD (Stochastic Gradient Descent) para treino dos 
             fatores latentes de usuários e itens. A ideia é em cada passada os valores de predição de
             testing se aproximem da nota real em validations.  A convergência é detectada pelo RMSE, 
-            caso ele não esteja melhorando mais que o threshhold definido, o algoritmo para, mas caso 
-            a execução ultrapasse de 4 min o aprendizado termina
+            caso ele não esteja melhorando mais que o threshhold definido, o algoritmo para. A passada
+            é feita pelo motor escolhido em `engine`.
+
+        Parameters:
+        -----------
+            epochCallback (function): Chamada ao fim de cada passada com o número da passada e o RMSE de
+            validação, nan nas passadas sem validação. Se ela retornar False o treino é interrompido
 
         Attributes:
         -----------
@@ -146,39 +597,104 @@ class CollaborativeRecommender:
 
             qi_ (array): Matriz de fatores latentes para os itens
 
+            epochsRun_ (int): Número de passadas executadas até a convergência ou até nEpochs
+
         """
+        engines = {
+            'sgd': self._runSGDEpoch,
+            'minibatch': self._runMiniBatchEpoch,
+            'als': self._runALSEpoch,
+            'hogwild': self._runHogwildEpoch,
+        }
+
+        if self.engine not in engines:
+            raise ValueError('engine deve ser um entre: ' + ', '.join(engines))
+
+        runEpoch = engines[self.engine]
+
+        if isinstance(self.training_, RatingShards):
+            if self.engine not in ('sgd', 'minibatch'):
+                raise ValueError("o treino fora da memória requer o motor 'sgd' ou 'minibatch'")
+
+            runEpoch = self._runShardedEpoch
+
+        self.validationRMSE_ = np.zeros((self.nEpochs, 1), dtype=float)
+
         bu, bi = self._initBias(self.training_)
         pu, qi = self._initLatentFactors(self.training_)
+        self.shuffler_ = np.random.RandomState(seed=13)
+
+        if self.engine == 'hogwild' and self.nJobs > 1:
+            self.hogwildShared_ = SharedArrays.create({'bu': bu, 'bi': bi, 'pu': pu, 'qi': qi, 'training': self.training_,
+                                                       'order': np.arange(self.training_.shape[0])})
+            self.hogwildExecutor_ = ProcessPoolExecutor(max_workers=self.nJobs)
+            bu, bi, pu, qi = [self.hogwildShared_[name] for name in ['bu', 'bi', 'pu', 'qi']]
+
+        try:
+            for epoch in range(self.nEpochs):
+                start = time.perf_counter()
+                runEpoch(self.training_, bu, bi, pu, qi)
+                self.epochsRun_ = epoch + 1
+
+                isImproving = self._checkIfPredictionsAreImproving(bu, bi, pu, qi, epoch)
+                self.instrumentation.epoch('CollaborativeRecommender', epoch, time.perf_counter() - start,
+                                           len(self.training_), float(self.validationRMSE_[epoch]))
+
+                isAccepted = epochCallback is None or epochCallback(epoch, float(self.validationRMSE_[epoch])) != False
+
+                if isImproving == False or not isAccepted:
+                    break
+
+            self.bu_ = np.array(bu)
+            self.bi_ = np.array(bi)
+            self.pu_ = np.array(pu)
+            self.qi_ = np.array(qi)
+        finally:
+            if hasattr(self, 'hogwildShared_'):
+                self.hogwildExecutor_.shutdown()
+                self.hogwildShared_.close()
+                del self.hogwildExecutor_, self.hogwildShared_
+
+    def _predictRatings(self, users, items, bu, bi, pu, qi):
+        """ Esse método calcula as notas preditas para pares (usuário, item) já mapeados para índices inteiros.
+            As predições são calculadas em lotes de `predictionBatchSize` pares, com máscaras para os usuários e
+            itens desconhecidos (índice -1), que recebem apenas os bias conhecidos.
+
+        Parameters:
+        -----------
+            users (numpy array): Índices dos usuários, ou -1 para usuários desconhecidos
+
+            items (numpy array): Índices dos itens, ou -1 para itens desconhecidos
 
-        for epoch in range(self.nEpochs):
-            for i in range(self.training_.shape[0]):
-                user = int(self.training_[i, 0])
-                item = int(self.training_[i, 1])
-                rating = self.training_[i, 2]
+            bu (array): Bias de usuários
 
-                prediction = self.globalMean_ + bu[user] + bi[item]
+            bi (array): Bias de itens
 
-                for factor in range(self.nFactors):
-                    prediction += pu[user, factor] * qi[item, factor]
+            pu (array): Matriz de fatores latentes para os usuários
+
+            qi (array): Matriz de fatores latentes para os itens
+
+        Returns:
+        -----------
+            predictions (numpy array): Notas preditas, sem o corte entre a nota mínima e a máxima
+
+        """
+        predictions = np.full(len(users), self.globalMean_, dtype=self._floatType())
 
-                error = rating - prediction
-                bu[user] += self.learningRate * (error - self.regularizationFactor * bu[user])
-                bi[item] += self.learningRate * (error - self.regularizationFactor * bi[item])
+        for start in range(0, len(users), self.predictionBatchSize):
+            batchUsers = users[start:start + self.predictionBatchSize]
+            batchItems = items[start:start + self.predictionBatchSize]
+            batchPredictions = predictions[start:start + self.predictionBatchSize]
 
-                for factor in range(self.nFactors):
-                    userFactor = pu[user, factor]
-                    itemFactor = qi[item, factor]
+            knownUsers = batchUsers > -1
+            knownItems = batchItems > -1
+            knownPairs = knownUsers & knownItems
 
-                    pu[user, factor] += self.learningRate * (error * itemFactor - self.regularizationFactor * userFactor)
-                    qi[item, factor] += self.learningRate * (error * userFactor - self.regularizationFactor * itemFactor)
-                
-            if self._checkIfPredictionsAreImproving(bu, bi, pu, qi, epoch) == False:
-                break
+            batchPredictions[knownUsers] += bu[batchUsers[knownUsers]]
+            batchPredictions[knownItems] += bi[batchItems[knownItems]]
+            batchPredictions[knownPairs] += np.einsum('ij,ij->i', pu[batchUsers[knownPairs]], qi[batchItems[knownPairs]])
 
-        self.bu_ = bu
-        self.bi_ = bi
-        self.pu_ = pu
-        self.qi_ = qi
+        return predictions
 
     def _computeValidationRMSE(self, bu, bi, pu, qi):
         """ Esse método calcula do RMSE de uma instância do recomendador para um dado conjunto de fatores latentes,
@@ -189,34 +705,39 @@ class CollaborativeRecommender:
             rmse (float): O RMSE (Root-Mean-Square Error) para um conjunto de fatores latentes 
 
         """
-        
-        error = []
+        if isinstance(self.validation_, RatingShards):
+            return self._computeStreamingRMSE(bu, bi, pu, qi)
 
-        for i in range(self.validation_.shape[0]):
-            user = int(self.validation_[i, 0])
-            item = int(self.validation_[i, 1])
-            rating = self.validation_[i, 2]
-            prediction = self.globalMean_
+        users, items, ratings = self._columns(self.validation_)
 
-            if user > -1:
-                prediction += bu[user]
+        error = (ratings - self._predictRatings(users, items, bu, bi, pu, qi)).astype(np.float64, copy=False)
+        rmse = np.sqrt((np.power(error,2)).mean())
 
-            if item > -1:
-                prediction += bi[item]
+        return rmse
 
-            if user > -1 and item > -1:
-                for factor in range(self.nFactors):
-                    prediction += pu[user, factor] * qi[item, factor]
+    def _computeStreamingRMSE(self, bu, bi, pu, qi):
+        """ Esse método calcula o RMSE de validação percorrendo os shards de validação um de cada vez, acumulando
+            a soma dos erros quadrados e o número de notas.
 
-            error.append(rating - prediction)
-            
-        error = np.array(error)
-        rmse = np.sqrt((np.power(error,2)).mean())
+        Returns:
+        -----------
+            rmse (float): O RMSE (Root-Mean-Square Error) sobre todos os shards de validação
 
-        return rmse
+        """
+        squaredErrors, nRatings = 0.0, 0
+
+        for shard in self.validation_.iterShards('validation'):
+            users, items, ratings = self._columns(shard)
+
+            error = (ratings - self._predictRatings(users, items, bu, bi, pu, qi)).astype(np.float64, copy=False)
+            squaredErrors += np.dot(error, error)
+            nRatings += len(error)
+
+        return np.sqrt(squaredErrors / max(nRatings, 1))
 
     def _checkIfPredictionsAreImproving(self, bu, bi, pu, qi, epoch):
-        """ Esse método verifica se o RMSE está melhorando a cada passada do SGD
+        """ Esse método verifica se o RMSE está melhorando a cada `validationFrequency` passadas do SGD. Nas
+            passadas em que a validação não é feita o RMSE é registrado como nan e o treino continua.
 
         Attributes:
         -----------
@@ -237,62 +758,431 @@ class CollaborativeRecommender:
             False (bool): se o RMSE não melhorou
 
         """
-        
+        if (epoch + 1) % self.validationFrequency != 0:
+            self.validationRMSE_[epoch] = np.nan
+            return True
+
         self.validationRMSE_[epoch] = self._computeValidationRMSE(bu, bi, pu, qi)
 
-        if epoch > 0 and self.validationRMSE_[epoch] + self.stopThreshold > self.validationRMSE_[epoch-1]:
+        validatedRMSE = self.validationRMSE_[:epoch + 1][~np.isnan(self.validationRMSE_[:epoch + 1])]
+
+        if len(validatedRMSE) > 1 and validatedRMSE[-1] + self.stopThreshold > validatedRMSE[-2]:
             return False
 
         return True
 
-    def _makePredictions(self):
+    def _sampleValidation(self, validation):
+        """ Esse método seleciona uma amostra aleatória fixa do conjunto de validação mapeado com
+            `validationSampleSize` notas, mantendo a ordem original. Se o tamanho não for definido ou for maior
+            que o conjunto, ele é retornado inteiro.
+
+        Parameters:
+        -----------
+            validation (numpy array): Dados de validação com as ids de usuários e itens mapeados
+
+        Returns:
+        -----------
+            validation (numpy array): Amostra dos dados de validação
+
+        """
+        if self.validationSampleSize is None or self.validationSampleSize >= validation.shape[0]:
+            return validation
+
+        sample = np.random.RandomState(seed=13).choice(validation.shape[0], self.validationSampleSize, replace=False)
+
+        return validation[np.sort(sample)]
+
+    def _mapIds(self, ids, mapping):
+        """ Esse método converte uma coluna de ids para os seus índices inteiros de uma só vez. Em colunas
+            categóricas apenas as categorias são mapeadas, e os índices são lidos pelos códigos.
+
+        Parameters:
+        -----------
+            ids (pandas series): Ids de usuários ou itens
+
+            mapping (dict): Dicionário para o mapeamento entre os ids e os seus indices inteiros, ou IdMapping
+
+        Returns:
+        -----------
+            indexes (numpy array): Índices inteiros dos ids, ou -1 para os ids desconhecidos
+
+        """
+        ids = pd.Series(ids)
+
+        if isinstance(ids.dtype, pd.CategoricalDtype):
+            categoryIndexes = self._mapIds(ids.cat.categories, mapping)
+            codes = ids.cat.codes.to_numpy()
+            return np.where(codes > -1, categoryIndexes[codes], -1)
+
+        if isinstance(mapping, IdMapping):
+            return mapping.lookup(ids.to_numpy())
+
+        return ids.map(mapping).fillna(-1).to_numpy(dtype=np.int64)
+
+    def _mappingIds(self, mapping):
+        """ Esse método retorna os ids de um mapeamento na ordem dos seus índices. No modo compacto o array do
+            IdMapping é retornado direto, e apenas os dicionários passam por uma lista.
+
+        Returns:
+        -----------
+            ids (numpy array): Ids na ordem dos índices
+
+        """
+        if isinstance(mapping, IdMapping):
+            return mapping.ids_
+
+        return np.array(list(mapping))
+
+    def _iterPredictions(self):
         """ Após o aprendizado dos fatores latentes para as matrizes de usuários e itens, esse método realiza a
             predição de notas para o dado conjunto de targets. Caso a nota predita ultrapasse o valor maximo ou
             fique menor que o valor mínimo, é considerado os valores máximo ou mínimo como a nota predita, ao
-            invés da nota 
+            invés da nota. Todos os pares são mapeados de uma vez e pontuados em lotes de `predictionBatchSize`,
+            entregues à medida que são pontuados.
 
-        Attributes:
+        Returns:
         -----------
-            prediction (float): Nota predita a partir do produto entre as matrizes de fatores latentes para
-            usuários e itens
+            predictions (generator): Dataframes com as colunas UserId, ItemId e Predictions, um por lote, na
+            ordem dos targets. Sem targets, um único lote vazio
 
         """
-        for user, item in self.targets_:
-            knownUser, knownItem = False, False
-            prediction = self.globalMean_
+        users = self._mapIds(self.targets_['UserId'], self.userMapping_)
+        items = self._mapIds(self.targets_['ItemId'], self.itemMapping_)
+
+        for start in range(0, max(len(users), 1), self.predictionBatchSize):
+            end = start + self.predictionBatchSize
+            predictions = self._predictRatings(users[start:end], items[start:end], self.bu_, self.bi_, self.pu_, self.qi_)
+            np.clip(predictions, self.minRating, self.maxRating, out=predictions)
+
+            yield pd.DataFrame({
+                'UserId': self.targets_['UserId'].to_numpy()[start:end],
+                'ItemId': self.targets_['ItemId'].to_numpy()[start:end],
+                'Predictions': predictions,
+            }, index=pd.RangeIndex(start, start + len(predictions)))
+
+    def _groupRatedItems(self, ratings=None):
+        """ Esse método agrupa os itens já avaliados por usuário, no formato CSR, para que os itens já avaliados
+            por um bloco de usuários possam ser obtidos sem percorrer as notas. Sem ratings são usadas todas as
+            notas vistas no treino, ou seja, o conjunto de treino e o de validação inteiro, inclusive as notas fora
+            da amostra de `validationSampleSize`.
 
-            if user in self.userMapping_:
-                knownUser = True
-                userIndex = self.userMapping_[user]
-                prediction += self.bu_[userIndex]
+        Parameters:
+        -----------
+            ratings (pandas dataframe): Notas conhecidas com as colunas UserId e ItemId. Ids desconhecidos
+            pelo modelo são ignorados
 
-            if item in self.itemMapping_:
-                knownItem = True
-                itemIndex = self.itemMapping_[item]
-                prediction += self.bi_[itemIndex]
+        Returns:
+        -----------
+            ratedItems (numpy array): Itens avaliados, ordenados por usuário
 
-            if knownUser and knownItem:
-                prediction += np.dot(self.pu_[userIndex], self.qi_[itemIndex])
+            userStarts (numpy array): Posição em ratedItems onde começam os itens de cada usuário, com uma
+            posição a mais para o fim do último usuário
 
-            if prediction > self.maxRating:
-                prediction = self.maxRating
-            
-            if prediction < self.minRating:
-                prediction = self.minRating
+        """
+        if ratings is not None:
+            users = self._mapIds(ratings['UserId'], self.userMapping_)
+            items = self._mapIds(ratings['ItemId'], self.itemMapping_)
+        else:
+            if not hasattr(self, 'training_'):
+                raise ValueError('excludeRated requer as notas conhecidas, indisponíveis em um modelo carregado')
 
-            self.predictions_.append([user, item, prediction])
+            if isinstance(self.training_, RatingShards):
+                raise ValueError('excludeRated requer as notas conhecidas em memória, indisponíveis no treino fora da memória')
 
-    def getPredictions(self, training, validation, targets, saveToFile=True, printOnConsole=True, getPredictions=True):
-        """ Esse método propriamente invoca os outros métodos da classe para processar os dados de
-            entrada e devidamente gerar as recomendações de itens em forma de arquivo ou na saída
-            padrão.
+            trainingUsers, trainingItems, _ = self._columns(self.training_)
+            validationUsers, validationItems, _ = self._columns(self.fullValidation_)
+            users = np.concatenate([trainingUsers, validationUsers])
+            items = np.concatenate([trainingItems, validationItems])
+
+        known = (users > -1) & (items > -1)
+        users, items = users[known], items[known]
+        order = np.argsort(users, kind='stable')
+
+        ratedItems = items[order].astype(np.int64)
+        userStarts = np.searchsorted(users[order], np.arange(len(self.bu_) + 1))
+
+        return ratedItems, userStarts
+
+    def _selectTopK(self, scores, k):
+        """ Esse método seleciona as k maiores notas de cada linha de uma matriz de notas por seleção parcial,
+            ordenando apenas os k selecionados.
+
+        Parameters:
+        -----------
+            scores (numpy array): Notas de um bloco de usuários para todos os itens
+
+            k (int): Número de itens selecionados por usuário
+
+        Returns:
+        -----------
+            topItems (numpy array): Índices dos k itens selecionados de cada linha, em ordem decrescente de nota
+
+            topScores (numpy array): Notas dos itens selecionados
+
+        """
+        k = min(k, scores.shape[1])
+        rows = np.arange(scores.shape[0])[:, np.newaxis]
+
+        topItems = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        topScores = scores[rows, topItems]
+
+        order = np.argsort(-topScores, axis=1, kind='stable')
+
+        return topItems[rows, order], topScores[rows, order]
+
+    def iterTopK(self, k=10, users=None, excludeRated=True, userBlockSize=1024, ratings=None):
+        """ Esse método gera os k itens de maior nota predita de cada usuário, comparando-o com todo o catálogo
+            de itens. Os usuários são processados em blocos de userBlockSize, cada bloco é pontuado por um
+            produto de matrizes entre os seus fatores e os fatores de todos os itens, e os resultados são
+            entregues bloco a bloco, sem formar a matriz usuários x itens inteira.
+
+        Parameters:
+        -----------
+            k (int): Número de itens recomendados por usuário
+
+            users (list): Ids dos usuários a recomendar. Se não definido, todos os usuários do modelo. Ids
+            desconhecidos são ignorados
+
+            excludeRated (bool): Se verdadeiro os itens já avaliados pelo usuário não são recomendados. Sem
+            ratings requer o modelo treinado nesta instância
+
+            userBlockSize (int): Número de usuários pontuados em cada bloco
+
+            ratings (pandas dataframe): Notas conhecidas excluídas das recomendações. Se não definido, as notas
+            de treino e de validação, como em `_groupRatedItems`
+
+        Returns:
+        -----------
+            recommendations (generator): Dataframes com as colunas UserId, ItemId e Predictions, um por bloco,
+            agrupados por usuário e ordenados por nota predita
+
+        """
+        userIds = self._mappingIds(self.userMapping_)
+        itemIds = self._mappingIds(self.itemMapping_)
+
+        if users is None:
+            userIndexes = np.arange(len(userIds))
+        else:
+            userIndexes = self._mapIds(users, self.userMapping_)
+            userIndexes = userIndexes[userIndexes > -1]
+
+        if excludeRated:
+            ratedItems, userStarts = self._groupRatedItems(ratings)
+
+        for start in range(0, len(userIndexes), userBlockSize):
+            block = userIndexes[start:start + userBlockSize]
+
+            scores = self.pu_[block] @ self.qi_.T
+            scores += self.bi_[np.newaxis, :]
+            scores += (self.globalMean_ + self.bu_[block])[:, np.newaxis]
+
+            if excludeRated:
+                counts = userStarts[block + 1] - userStarts[block]
+                rows = np.repeat(np.arange(len(block)), counts)
+                positions = np.repeat(userStarts[block] - np.r_[0, np.cumsum(counts)[:-1]], counts) + np.arange(counts.sum())
+                scores[rows, ratedItems[positions]] = -np.inf
+
+            topItems, topScores = self._selectTopK(scores, k)
+            selected = np.isfinite(topScores)
+
+            yield pd.DataFrame({
+                'UserId': np.repeat(userIds[block], topItems.shape[1])[selected.ravel()],
+                'ItemId': itemIds[topItems[selected]],
+                'Predictions': np.clip(topScores[selected], self.minRating, self.maxRating),
+            })
+
+    def recommendTopK(self, k=10, users=None, excludeRated=True, userBlockSize=1024, ratings=None):
+        """ Esse método retorna os k itens de maior nota predita de cada usuário em um único dataframe. Os
+            parâmetros são os mesmos de `iterTopK`.
+
+        Returns:
+        -----------
+            recommendations (pandas dataframe): Itens recomendados com as colunas UserId, ItemId e Predictions,
+            agrupados por usuário e ordenados por nota predita
+
+        """
+        blocks = list(self.iterTopK(k, users=users, excludeRated=excludeRated, userBlockSize=userBlockSize, ratings=ratings))
+
+        if not blocks:
+            return pd.DataFrame(columns=['UserId', 'ItemId', 'Predictions'])
+
+        return pd.concat(blocks, ignore_index=True)
+
+    def _encodeData(self, training, validation):
+        """ Esse método mapeia os ids dos dados de treino e validação para índices inteiros e calcula a média
+            global, preparando os atributos lidos por `_learnFactors`.
+        """
+        self.userMapping_ = self._initDataSetMapping(training, columnName='UserId')
+        self.itemMapping_ = self._initDataSetMapping(training, columnName='ItemId')
+
+        with self.instrumentation.stage('CollaborativeRecommender', '_generateMappedDataset'):
+            self.training_ = self._generateMappedDataset(training)
+            self.fullValidation_ = self._generateMappedDataset(validation)
+            self.validation_ = self._sampleValidation(self.fullValidation_)
+
+        self.globalMean_ = np.mean(self._columns(self.training_)[2], dtype=np.float64)
+
+    def train(self, training, validation, epochCallback=None):
+        """ Esse método mapeia os ids dos dados de treino e validação e aprende os bias e fatores latentes
+            do modelo, sem gerar predições.
 
         Parameters:
         -----------
             training (pandas dataframe): Dados de treino com as notas de usuário para itens.
             
             validation (pandas dataframe): Dados de validação com as notas de usuário para itens.
+
+            epochCallback (function): Chamada ao fim de cada passada com o número da passada e o RMSE de
+            validação. Se ela retornar False o treino é interrompido, como na busca de hiperparâmetros
+
+        Attributes:
+        -----------
+            userMapping_ (dict): Dicionário para os ids e o index de int para os usuários
+
+            itemMapping_ (dict): Dicionário para os ids e o index de int para os itens
+
+            training_ (numpy array): Dados de treino do algoritmo com as ids de usuários e itens mapeados para 
+            números inteiros
             
+            validation_ (numpy array): Dados de validação do algoritmo com as ids de usuários e itens mapeados 
+            para números inteiros, reduzidos à amostra de `validationSampleSize` notas quando definida
+
+            fullValidation_ (numpy array): Dados de validação mapeados antes da amostra, lidos para excluir os
+            itens já avaliados nas recomendações
+
+            globalMean_ (float): Média global das notas do conjunto de treino
+
+            validationRMSE_ (array): RMSE das presdições feitas para o conjunto de validação, usado para
+            identificar se as predições não estão melhorando significamente mais. Passadas sem validação
+            ficam com nan
+
+        Returns:
+        -----------
+            self (CollaborativeRecommender): O próprio recomendador treinado
+
+        """
+        self._encodeData(training, validation)
+
+        with self.instrumentation.stage('CollaborativeRecommender', '_learnFactors'):
+            self._learnFactors(epochCallback)
+
+        return self
+
+    def trainOutOfCore(self, shards, epochCallback=None):
+        """ Esse método treina o modelo sobre notas gravadas em shards por `RatingShards`, sem carregá-las em
+            memória: cada passada percorre os shards de treino em ordem embaralhada e o RMSE de validação é
+            calculado em uma passada pelos shards de validação. O pico de memória depende do tamanho dos shards e
+            do modelo, e não do número de notas. Requer o motor 'minibatch' ou 'sgd', e o modo compacto é
+            recomendado para que os mapeamentos de ids também fiquem em arrays.
+
+        Parameters:
+        -----------
+            shards (RatingShards): Shards das notas de treino e de validação
+
+            epochCallback (function): Chamada ao fim de cada passada, como em `train`
+
+        Returns:
+        -----------
+            self (CollaborativeRecommender): O próprio recomendador treinado
+
+        """
+        userIds, itemIds = shards.ids('userIds'), shards.ids('itemIds')
+
+        if self.compact:
+            self.userMapping_, self.itemMapping_ = IdMapping(userIds), IdMapping(itemIds)
+        else:
+            self.userMapping_ = dict(zip(userIds.tolist(), range(len(userIds))))
+            self.itemMapping_ = dict(zip(itemIds.tolist(), range(len(itemIds))))
+
+        self.training_ = shards
+        self.validation_ = shards
+        self.globalMean_ = shards.metadata_['globalMean']
+
+        with self.instrumentation.stage('CollaborativeRecommender', '_learnFactors'):
+            self._learnFactors(epochCallback)
+
+        return self
+
+    def _growRows(self, name, newRows):
+        """ Esse método acrescenta linhas a um dos arrays de bias ou fatores latentes. O array é mantido como uma
+            visão do início de um buffer com capacidade de sobra, que dobra quando se esgota, então as atualizações
+            só copiam o modelo quando o buffer cresce. Arrays somente leitura, como os mapeados por `loadModel`,
+            são copiados para um buffer na primeira atualização.
+
+        Parameters:
+        -----------
+            name (str): Nome do atributo, bu_, bi_, pu_ ou qi_
+
+            newRows (numpy array): Linhas acrescentadas ao fim do array
+
+        """
+        array = getattr(self, name)
+        buffer = self.rowBuffers_.get(name)
+        owned = buffer is not None and array.base is buffer
+
+        if len(newRows) == 0 and (owned or array.flags.writeable):
+            return
+
+        nRows = len(array) + len(newRows)
+
+        if not owned or nRows > len(buffer):
+            buffer = np.empty((max(nRows, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+            buffer[:len(array)] = array
+            self.rowBuffers_[name] = buffer
+
+        buffer[len(array):nRows] = newRows
+        setattr(self, name, buffer[:nRows])
+
+    def updateModel(self, newRatings, nSteps=3):
+        """ Esse método incorpora um lote de novas notas a um modelo já treinado, sem refazer o treino. Os
+            usuários e itens ainda desconhecidos são acrescentados aos mapeamentos, com bias zerados e fatores
+            aleatórios como na inicialização, e então são feitas nSteps passadas do SGD apenas sobre as novas
+            notas. Assim somente as linhas dos usuários e itens afetados mudam e o custo é proporcional ao lote.
+            O gerador dos fatores iniciais é criado na primeira atualização e reutilizado nas seguintes, para que
+            usuários e itens acrescentados em atualizações diferentes não comecem com os mesmos fatores, e os
+            arrays do modelo só crescem por `_growRows` quando há ids novos.
+
+        Parameters:
+        -----------
+            newRatings (pandas dataframe): Novas notas com as colunas UserId, ItemId e Rating
+
+            nSteps (int): Número de passadas do SGD sobre as novas notas
+
+        Returns:
+        -----------
+            self (CollaborativeRecommender): O próprio recomendador atualizado
+
+        """
+        nNewUsers = self._extendDataSetMapping(self.userMapping_, newRatings, columnName='UserId')
+        nNewItems = self._extendDataSetMapping(self.itemMapping_, newRatings, columnName='ItemId')
+
+        if not hasattr(self, 'initializer_'):
+            self.initializer_ = np.random.RandomState(seed=13)
+            self.rowBuffers_ = {}
+
+        initializer = self.initializer_
+        self._growRows('bu_', np.zeros(nNewUsers))
+        self._growRows('bi_', np.zeros(nNewItems))
+        self._growRows('pu_', initializer.normal(0, .01, (nNewUsers, self.nFactors)))
+        self._growRows('qi_', initializer.normal(0, .01, (nNewItems, self.nFactors)))
+
+        dataSet = self._generateMappedDataset(newRatings)
+        runEpoch = self._runSGDEpoch if self.engine == 'sgd' else self._runMiniBatchEpoch
+        self.shuffler_ = np.random.RandomState(seed=13)
+
+        for step in range(nSteps):
+            runEpoch(dataSet, self.bu_, self.bi_, self.pu_, self.qi_)
+
+        return self
+
+    def predict(self, targets, saveToFile=False, printOnConsole=False, getPredictions=True, outputPath='submission.csv', output=None):
+        """ Esse método gera as predições de notas de um modelo já treinado, ou carregado com `loadModel`,
+            para os pares (usuário, item) dos targets. As saídas recebem cada lote de `predictionBatchSize`
+            predições assim que ele é pontuado, ordenado por usuário e nota predita dentro do lote, sem montar o
+            dataframe de todas as predições quando getPredictions é falso.
+
+        Parameters:
+        -----------
             targets (pandas dataframe): Dados com os usuários e os itens que desejamos realizar as previsões 
             de notas
             
@@ -302,57 +1192,180 @@ class CollaborativeRecommender:
             printOnConsole (bool): Se verdadeitom indica que queremos que a as predições de notas sejam 
             impressas na saída padrão, ou seja, no terminal de execução
 
+            outputPath (str): Arquivo gerado quando saveToFile é verdadeiro. Caminhos terminados em .gz são
+            comprimidos
+
+            output (OutputWriter): Saída adicional para onde as predições são gravadas
+
         Attributes:
         -----------
-            userMapping_ (dict): Dicionário para os ids e o index de int para os usuários
+            targets_ (pandas dataframe): Pares (usuário, item) dos dados de teste do algoritmo
 
-            itemMapping_ (dict): Dicionário para os ids e o index de int para os itens
+            predictions_ (pandas dataframe): Notas preditas para cada (usuário, item) em targets_, ordenadas
+            por usuário e nota predita. Montado apenas quando getPredictions é verdadeiro
 
-            training_ (numpy array): Dados de treino do algoritmo com as ids de usuários e itens mapeados para 
-            números inteiros
+        """
+        self.targets_ = targets[['UserId', 'ItemId']]
+        batches = []
+
+        with ExitStack() as stack, self.instrumentation.stage('CollaborativeRecommender', '_makePredictions'):
+            writers = [] if output is None else [output]
+
+            if saveToFile:
+                writers.append(stack.enter_context(OutputWriter(outputPath)))
+
+            if printOnConsole:
+                writers.append(stack.enter_context(OutputWriter('-', columns=['UserId', 'ItemId'])))
+
+            for batch in self._iterPredictions():
+                if writers:
+                    sortedBatch = batch.sort_values(['UserId', 'Predictions'], ascending=[True, False])
+
+                    for writer in writers:
+                        writer.write(sortedBatch)
+
+                if getPredictions:
+                    batches.append(batch)
+
+        if getPredictions:
+            self.predictions_ = pd.concat(batches).sort_values(['UserId','Predictions'], ascending=[True, False])
+
+            return self.predictions_
+
+    def getPredictions(self, training, validation, targets, saveToFile=True, printOnConsole=True, getPredictions=True,
+                       outputPath='submission.csv', output=None):
+        """ Esse método propriamente invoca os outros métodos da classe para processar os dados de
+            entrada e devidamente gerar as recomendações de itens em forma de arquivo ou na saída
+            padrão. O treino é feito por `train` e as predições por `predict`.
+
+        Parameters:
+        -----------
+            training (pandas dataframe): Dados de treino com as notas de usuário para itens.
             
-            validation_ (numpy array): Dados de validação do algoritmo com as ids de usuários e itens mapeados 
-            para números inteiros
+            validation (pandas dataframe): Dados de validação com as notas de usuário para itens.
             
-            targets_ (zip): Iterador para os dados de teste do algoritmo
+            targets (pandas dataframe): Dados com os usuários e os itens que desejamos realizar as previsões 
+            de notas
+            
+            saveToFile (bool): Se verdadeiro indica que queremos gerar um arquivo .csv de saída com as 
+            predições de notas
+            
+            printOnConsole (bool): Se verdadeitom indica que queremos que a as predições de notas sejam 
+            impressas na saída padrão, ou seja, no terminal de execução
 
-            predictions_ (array): Notas preditas para cada (usuário, item) em targets_
+            outputPath (str): Arquivo gerado quando saveToFile é verdadeiro
 
-            globalMean_ (float): Média global das notas do conjunto de treino
+            output (OutputWriter): Saída adicional para onde as predições são gravadas
 
-            validationRMSE_ (array): RMSE das presdições feitas para o conjunto de validação, usado para
-            identificar se as predições não estão melhorando significamente mais
+        """
+        self.train(training, validation)
+
+        return self.predict(targets, saveToFile=saveToFile, printOnConsole=printOnConsole, getPredictions=getPredictions,
+                            outputPath=outputPath, output=output)
+
+    def _getParams(self):
+        """ Esse método retorna os hiperparâmetros do recomendador, ou seja, os argumentos do construtor, exceto a
+            instrumentação, que não faz parte do modelo.
+
+        Returns:
+        -----------
+            params (dict): Hiperparâmetros do recomendador
 
         """
+        names = inspect.signature(type(self).__init__).parameters
+        return {name: getattr(self, name) for name in names if name not in ('self', 'instrumentation')}
+
+    def saveModel(self, path):
+        """ Esse método salva um modelo treinado em um diretório, para que novos targets possam ser
+            pontuados sem treinar de novo. Os bias, os fatores latentes e os ids mapeados são gravados como
+            arquivos .npy, que podem ser mapeados em memória na carga, e os hiperparâmetros e a média global
+            em um arquivo model.json. O diretório é montado em um temporário e renomeado ao final, como o cache de
+            `ContentRecommender._saveContentCache`, para que nem uma execução interrompida nem um modelo mapeado a
+            partir do mesmo diretório deixem arquivos incompletos. Os arquivos de um modelo anterior no diretório,
+            como o índice de `ItemFactorIndex`, são descartados com ele.
 
-        self.userMapping_ = self._initDataSetMapping(training, columnName='UserId')
-        self.itemMapping_ = self._initDataSetMapping(training, columnName='ItemId')
+        Parameters:
+        -----------
+            path (str): Diretório onde o modelo é salvo, substituído se já existir
+
+        """
+        parentPath = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parentPath, exist_ok=True)
+        buildPath = tempfile.mkdtemp(dir=parentPath)
+
+        arrays = {
+            'bu': self.bu_,
+            'bi': self.bi_,
+            'pu': self.pu_,
+            'qi': self.qi_,
+            'userIds': self._mappingIds(self.userMapping_),
+            'itemIds': self._mappingIds(self.itemMapping_),
+        }
+
+        for name, array in arrays.items():
+            np.save(os.path.join(buildPath, name + '.npy'), array, allow_pickle=False)
+
+        model = {
+            'params': self._getParams(),
+            'globalMean': float(self.globalMean_),
+            'minRating': self.minRating,
+            'maxRating': self.maxRating,
+        }
+
+        with open(os.path.join(buildPath, 'model.json'), 'w') as f:
+            json.dump(model, f, indent=4)
+
+        if not os.path.exists(path):
+            os.rename(buildPath, path)
+            return
+
+        oldPath = tempfile.mkdtemp(dir=parentPath)
+        os.rename(path, os.path.join(oldPath, 'model'))
+        os.rename(buildPath, path)
+        shutil.rmtree(oldPath)
+
+    @classmethod
+    def loadModel(cls, path, mmap=True, instrumentation=None):
+        """ Esse método carrega um modelo salvo por `saveModel`. Com mmap os bias e fatores latentes são
+            mapeados em memória e somente lidos do disco à medida que são usados.
 
-        self.training_ = self._generateMappedDataset(training)
-        self.validation_ = self._generateMappedDataset(validation)
+        Parameters:
+        -----------
+            path (str): Diretório onde o modelo foi salvo
 
-        self.targets_ = zip(targets['UserId'], targets['ItemId'])
+            mmap (bool): Se verdadeiro os arrays são mapeados em memória no modo somente leitura
 
-        self.predictions_ = []
-        self.globalMean_ = np.mean(self.training_[:, 2])
-        self.validationRMSE_ = np.zeros((self.nEpochs, 1), dtype=float)
+            instrumentation (Instrumentation): Instrumentação do recomendador carregado
 
-        self._learnFactors()
-        self._makePredictions()
+        Returns:
+        -----------
+            recommender (CollaborativeRecommender): Recomendador pronto para o `predict`
 
-        if saveToFile:
-            self.predictions_ = pd.DataFrame(self.predictions_, columns=['UserId', 'ItemId', 'Predictions'])
-            self.predictions_ = self.predictions_.sort_values(['UserId','Predictions'], ascending=[True, False])
+        """
+        with open(os.path.join(path, 'model.json'), 'r') as f:
+            model = json.load(f)
 
-            submissionFile = self.predictions_[['UserId','ItemId', 'Predictions']]
-            submissionFile.to_csv('submission.csv', index=False, sep=',')
-        
-        if printOnConsole:
-            print('UserId','ItemId')
-            for user, item in self.predictions_:
-                print(user, item, sep=',')
+        recommender = cls(**model['params'], instrumentation=instrumentation)
+        recommender.globalMean_ = model['globalMean']
+        recommender.minRating = model['minRating']
+        recommender.maxRating = model['maxRating']
 
-        if getPredictions:
-            self.predictions_ = pd.DataFrame(self.predictions_, columns=['UserId', 'ItemId', 'Predictions'])
-            self.predictions_ = self.predictions_.sort_values(['UserId','Predictions'], ascending=[True, False])
-            return self.predictions_
\ No newline at end of file
+        mmapMode = 'r' if mmap else None
+        load = lambda name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmapMode, allow_pickle=False)
+
+        recommender.bu_ = load('bu')
+        recommender.bi_ = load('bi')
+        recommender.pu_ = load('pu')
+        recommender.qi_ = load('qi')
+
+        if recommender.compact:
+            recommender.userMapping_ = IdMapping(load('userIds'))
+            recommender.itemMapping_ = IdMapping(load('itemIds'))
+            return recommender
+
+        userIds = load('userIds').tolist()
+        itemIds = load('itemIds').tolist()
+        recommender.userMapping_ = dict(zip(userIds, range(len(userIds))))
+        recommender.itemMapping_ = dict(zip(itemIds, range(len(itemIds))))
+
+        return recommender
@@ -1,12 +1,36 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
 import pandas as pd
 
+from ..DataLoader.DataLoader import DataLoader
+from ..Instrumentation.Instrumentation import Instrumentation
+from ..RatingScale.RatingScale import RatingScale
+
 class ContentRecommender:
-    def __init__(self):
+    def __init__(self, targetBatchSize=100000, cacheDir=None, instrumentation=None):
         """ Esse classe implementa um recomendador baseado em conteúdo que utiliza os genêros dos filmes
             como features para identificar as similaridades de novos itens com base no que os usuários já
             consumiram.
+
+        Attributes:
+        -----------
+            targetBatchSize (int): Número de pares (usuário, item) dos targets pontuados por lote, o que limita
+            o pico de memória do cálculo das similaridades
+
+            cacheDir (str): Diretório do cache dos dados de conteúdo corrigidos e da matriz de gêneros. Usado
+            quando o conteúdo é passado como caminho do arquivo .jsonl
+
+            instrumentation (Instrumentation): Registra o tempo e a memória de cada etapa. Se não definida, nada é
+            medido
         """
-        pass
+        self.targetBatchSize = targetBatchSize
+        self.cacheDir = cacheDir
+        self.instrumentation = instrumentation or Instrumentation.disabled()
     
     def _correctContentData(self):
         """ Essa função faz a correção dos dados de conteúdo dos filmes. É feita correção de tipos, remoção
@@ -41,108 +65,318 @@ class ContentRecommender:
 
         self.content_ = self.content_[['ItemId','Genre', 'Metascore', 'imdbRating', 'imdbVotes', 'BoxOffice']].copy()
 
-    def _transformGenresIntoColumns(self):
-        """ Essa função converte a lista de gêneros que cada item possui em novas colunas. Cada gênero recebe uma
-            nova coluna e o item recebe valor 1 se ele possui tal gênero em sua lista de gêneros. Essa conversão é 
-            feita para que os gêneros possam ser tratados com features.
+    def _encodeGenres(self):
+        """ Essa função converte a lista de gêneros que cada item possui em uma matriz esparsa item x gênero, no
+            formato CSR, alinhada ao índice de itens. O vocabulário de gêneros é construído em uma única passada,
+            na ordem em que os gêneros aparecem, e cada item tem valor 1 nos gêneros da sua lista. Essa conversão
+            é feita para que os gêneros possam ser tratados com features.
         """
-
         splittedGenres = self.content_['Genre'].str.split(',')
-        self.genres_ = list(dict.fromkeys([y for x in splittedGenres for y in x]).keys())
+        nGenresPerItem = splittedGenres.str.len().to_numpy()
 
-        for genre in self.genres_:
-            self.content_[genre] = self.content_['Genre'].apply(lambda x : 1 if genre in x else 0)
+        genreCodes, genres = pd.factorize(np.concatenate(splittedGenres.to_numpy()))
+        itemRows = np.repeat(np.arange(len(self.content_)), nGenresPerItem)
+
+        itemGenres = np.unique(itemRows * len(genres) + genreCodes)
+
+        self.genres_ = genres.tolist()
+        self.itemIndex_ = pd.Index(self.content_['ItemId'])
+        self.genreIndices_ = itemGenres % len(genres)
+        self.genreIndptr_ = np.searchsorted(itemGenres // len(genres), np.arange(len(self.content_) + 1))
 
         self.content_ = self.content_.drop(['Genre'], axis=1)
-    
-    def _mergeRawData(self):
-        """ Essa função cria novas colunas nas tabelas de itens avaliados e itens para predição relacionadas
-            com as features de gênero de cada item da tabela de conteúdo. Os itens sem dados são preenchidos com
-            valores nulos, indicando que não se tem conhecimento das características do filme.
-        """
 
-        self.ratings_ = self.ratings_.merge(self.content_, on='ItemId')
-        self.ratings_ = self.ratings_.drop(['Metascore', 'imdbRating', 'imdbVotes', 'BoxOffice'], axis=1)
+    def _expandItemGenres(self, itemIndexes):
+        """ Essa função lista as entradas não nulas da matriz item x gênero para cada posição de itemIndexes. Itens
+            com índice -1, ou seja, sem dados de conteúdo, não têm entradas.
 
-        self.targets_ = self.targets_.merge(self.content_, on='ItemId', how='outer')
-        self.targets_ = self.targets_.fillna(0)
+        Returns:
+        -----------
+            positions (numpy array): Posição em itemIndexes de cada entrada
 
-    def _replaceRatings(self, row):
-        """ Essa função substitui uma nota pela escala correspondente a essa nota conforme a métrica estabelecida.
+            genres (numpy array): Gênero de cada entrada
         """
-        if row['Rating'] == 10: 
-            grade = 3
-        elif row['Rating'] > 7: 
-            grade = 2
-        elif row['Rating'] > 5: 
-            grade = 1
-        else:
-            grade = 0
-        return grade
+        itemIndexes = np.asarray(itemIndexes)
+        knownItems = itemIndexes > -1
+
+        counts = np.zeros(len(itemIndexes), dtype=np.int64)
+        counts[knownItems] = self.genreIndptr_[itemIndexes[knownItems] + 1] - self.genreIndptr_[itemIndexes[knownItems]]
+
+        starts = self.genreIndptr_[np.where(knownItems, itemIndexes, 0)]
+        entries = np.repeat(starts - np.r_[0, np.cumsum(counts)[:-1]], counts) + np.arange(counts.sum())
+
+        return np.repeat(np.arange(len(itemIndexes)), counts), self.genreIndices_[entries]
     
+    def _mergeRawData(self):
+        """ Essa função associa à tabela de itens avaliados o índice de cada item na matriz de gêneros. As notas de
+            itens sem dados são descartadas, já que não se tem conhecimento das características do filme.
+        """
+
+        self.ratings_ = self.ratings_.assign(ItemIndex=self.itemIndex_.get_indexer(self.ratings_['ItemId']))
+        self.ratings_ = self.ratings_[self.ratings_['ItemIndex'] > -1]
+
     def _calculateGrade(self):
         """ Essa função cria uma nova coluna correspondente a escala de nota que o usuário deu a um filme. Se a nota é 10 a
             escala é 3, indicando uma recomendação perfeita. Se é 9 ou 8 a escala é 2, se é 7 ou 6 a escala é 1 e se for entre
             0 e 5 a escala é zero, representando uma escolha ruim ou não avaliada.
         """
-        self.ratings_['Grade'] = self.ratings_.apply(self._replaceRatings, axis=1)
+        self.ratings_['Grade'] = RatingScale.grade(self.ratings_['Rating'].to_numpy())
     
+    def _buildUserProfiles(self):
+        """ Essa função calcula o perfil de cada usuário como a soma dos vetores de gênero dos itens que ele avaliou,
+            ponderados pela escala da nota dividida pelo número de avaliações do usuário. As somas e as contagens são
+            guardadas separadas, para que novas notas atualizem apenas os usuários afetados em `updateProfiles`. A
+            soma é feita direto sobre as entradas da matriz esparsa, agrupadas em uma matriz usuário x gênero.
+
+        Attributes:
+        -----------
+            userIndex_ (pandas index): Ids dos usuários, na ordem das linhas dos perfis
+
+            profileSums_ (numpy array): Soma dos vetores de gênero ponderados pela escala da nota de cada usuário
+
+            ratingCounts_ (numpy array): Número de avaliações de cada usuário
+
+            userProfiles_ (numpy array): Perfis dos usuários, as somas divididas pelas contagens
+
+            userNorms_ (numpy array): Norma do perfil de cada usuário
+
+            itemNorms_ (numpy array): Norma do vetor de gêneros de cada item
+
+        """
+        userCodes, userIds = pd.factorize(self.ratings_['UserId'])
+        frequency = np.bincount(userCodes)
+        weights = self.ratings_['Grade'].to_numpy() / frequency[userCodes]
+
+        positions, genres = self._expandItemGenres(self.ratings_['ItemIndex'].to_numpy())
+        nGenres = len(self.genres_)
+
+        self.userIndex_ = pd.Index(userIds)
+        self.userProfiles_ = np.bincount(userCodes[positions] * nGenres + genres, weights=weights[positions],
+                                         minlength=len(userIds) * nGenres).reshape(len(userIds), nGenres)
+
+        self.ratingCounts_ = frequency
+        self.profileSums_ = self.userProfiles_ * frequency[:, np.newaxis]
+
+        self.userNorms_ = np.sqrt(np.einsum('ij,ij->i', self.userProfiles_, self.userProfiles_))
+        self.itemNorms_ = np.sqrt(np.diff(self.genreIndptr_))
+
+    def _refreshProfiles(self, users):
+        """ Essa função recalcula os perfis e as normas das linhas users a partir das somas e das contagens.
+        """
+        self.userProfiles_[users] = self.profileSums_[users] / self.ratingCounts_[users, np.newaxis]
+        self.userNorms_[users] = np.sqrt(np.einsum('ij,ij->i', self.userProfiles_[users], self.userProfiles_[users]))
+
+    def _gradeNewRatings(self, ratings):
+        """ Essa função associa às novas notas o índice dos itens e a escala da nota, como `_mergeRawData` e
+            `_calculateGrade` fazem com o histórico.
+        """
+        ratings = ratings.assign(ItemIndex=self.itemIndex_.get_indexer(ratings['ItemId']))
+        ratings = ratings[ratings['ItemIndex'] > -1]
+
+        return ratings.assign(Grade=RatingScale.grade(ratings['Rating'].to_numpy()))
+
+    def _scoreTargets(self, targets):
+        """ Essa função calcula a similaridade de um lote de pares (usuário, item) dos targets. Os índices do usuário e
+            do item são obtidos de uma vez, e o produto interno entre o perfil do usuário e o vetor de gêneros do item é
+            somado sobre as entradas não nulas do item. Pares de usuários sem avaliações são descartados e itens sem
+            dados recebem features nulas.
+        """
+        users = self.userIndex_.get_indexer(targets['UserId'])
+        targets = targets[users > -1]
+        users = users[users > -1]
+
+        items = self.itemIndex_.get_indexer(targets['ItemId'])
+        knownItems = items > -1
+
+        similarities = targets[['UserId', 'ItemId']].copy()
+
+        for feature in ['Metascore', 'imdbRating', 'imdbVotes', 'BoxOffice']:
+            similarities[feature] = np.where(knownItems, self.content_[feature].to_numpy()[items], 0)
+
+        positions, genres = self._expandItemGenres(items)
+        userItemNum = np.bincount(positions, weights=self.userProfiles_[users[positions], genres], minlength=len(items))
+        itemDen = np.where(knownItems, self.itemNorms_[items], 0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            similarities['Similarity'] = userItemNum / (self.userNorms_[users] * itemDen)
+
+        return similarities
+
     def _generateSimilarities(self):
         """ Essa função uma matriz usuário-item e a similaridade entre eles como a recomendação de Rocchio, ou seja, o cosseno entre
             o vetor de features dos itens e dos usuários. A similaridade representa o quanto um item não consumido é semelhante aos
-            outros itens já consumidos pelo usuário.
+            outros itens já consumidos pelo usuário. Os perfis dos usuários já devem estar calculados.
         """
-        self.ratings_['Frequency'] = self.ratings_.groupby('UserId')['UserId'].transform('count')
+        self.semilarities_ = self.scoreTargets(self.targets_)
+    
+    def _hashFile(self, path):
+        """ Essa função calcula o hash SHA-256 do conteúdo de um arquivo, lido em blocos.
+        """
+        digest = hashlib.sha256()
+
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
 
-        for genre in self.genres_:
-            self.ratings_[genre] = self.ratings_[genre] * self.ratings_['Grade'] / self.ratings_['Frequency']
-        
-        userProfile = self.ratings_.copy().drop(['ItemId', 'Timestamp', 'Rating', 'Grade', 'Frequency'], axis=1)
-        userProfile = userProfile.groupby('UserId').sum()
+        return digest.hexdigest()
 
-        for genre in self.genres_:
-            userProfile['User' + genre] = userProfile[genre]
-            userProfile = userProfile.drop(genre, axis=1)
+    def _saveContentCache(self, cachePath):
+        """ Essa função grava os dados de conteúdo corrigidos e a matriz de gêneros no diretório do cache, com um
+            arquivo .npy por coluna. O diretório é montado em um temporário e renomeado ao final, para que uma
+            execução interrompida não deixe um cache incompleto.
+        """
+        os.makedirs(self.cacheDir, exist_ok=True)
+        buildPath = tempfile.mkdtemp(dir=self.cacheDir)
 
-        for genre in self.genres_:
-            self.targets_['Item' + genre] = self.targets_[genre]
-            self.targets_ = self.targets_.drop(genre, axis=1)
-        
-        self.targets_ = pd.merge(self.targets_, userProfile, on=['UserId'])
+        columns = {column: self.content_[column].to_numpy() for column in self.content_.columns}
+        columns['ItemId'] = np.array(self.content_['ItemId'].tolist())
+        columns['genreIndptr'] = self.genreIndptr_
+        columns['genreIndices'] = self.genreIndices_
 
-        similarities = self.targets_[['UserId', 'ItemId', 'Metascore', 'imdbRating', 'imdbVotes', 'BoxOffice']].copy()
+        for name, values in columns.items():
+            np.save(os.path.join(buildPath, name + '.npy'), values, allow_pickle=False)
 
-        similarities['UserItemNum'] = 0
-        similarities['UserDen'] = 0
-        similarities['ItemDen'] = 0
+        with open(os.path.join(buildPath, 'genres.json'), 'w') as f:
+            json.dump({'genres': self.genres_, 'columns': self.content_.columns.tolist()}, f)
 
-        for genre in self.genres_:
-            similarities['UserItemNum'] += self.targets_['User' + genre] * self.targets_['Item' + genre]
-            similarities['UserDen'] += self.targets_['User' + genre] * self.targets_['User' + genre]
-            similarities['ItemDen'] += self.targets_['Item' + genre] * self.targets_['Item' + genre]
+        try:
+            os.rename(buildPath, cachePath)
+        except OSError:
+            shutil.rmtree(buildPath)
 
-        similarities['UserDen'] = similarities['UserDen'].pow(1./2)
-        similarities['ItemDen'] = similarities['ItemDen'].pow(1./2)
-        similarities['Similarity'] = similarities['UserItemNum'] / (similarities['UserDen'] * similarities['ItemDen'])
+    def _loadContentCache(self, cachePath):
+        """ Essa função carrega do diretório do cache os dados de conteúdo corrigidos e a matriz de gêneros.
+        """
+        with open(os.path.join(cachePath, 'genres.json'), 'r') as f:
+            metadata = json.load(f)
 
-        similarities = similarities.drop(['UserItemNum', 'UserDen', 'ItemDen'], axis=1)
+        load = lambda name: np.load(os.path.join(cachePath, name + '.npy'), allow_pickle=False)
+
+        self.content_ = pd.DataFrame({column: load(column) for column in metadata['columns']})
+        self.genres_ = metadata['genres']
+        self.itemIndex_ = pd.Index(self.content_['ItemId'])
+        self.genreIndptr_ = load('genreIndptr')
+        self.genreIndices_ = load('genreIndices')
+
+    def _cleanContent(self):
+        """ Essa função corrige os dados de conteúdo e monta a matriz de gêneros, medindo cada etapa.
+        """
+        with self.instrumentation.stage('ContentRecommender', '_correctContentData'):
+            self._correctContentData()
+
+        with self.instrumentation.stage('ContentRecommender', '_encodeGenres'):
+            self._encodeGenres()
+
+    def _prepareContent(self, content):
+        """ Essa função corrige os dados de conteúdo e monta a matriz de gêneros. Se o conteúdo for o caminho do
+            arquivo .jsonl e houver cacheDir, o resultado é lido do cache identificado pelo hash do arquivo, ou
+            calculado e gravado no cache caso o arquivo tenha mudado.
+        """
+        if not isinstance(content, str):
+            self.content_ = content
+            self._cleanContent()
+            return
+
+        cachePath = None if self.cacheDir is None else os.path.join(self.cacheDir, self._hashFile(content))
+
+        if cachePath is not None and os.path.isdir(cachePath):
+            with self.instrumentation.stage('ContentRecommender', '_loadContentCache'):
+                self._loadContentCache(cachePath)
+            return
+
+        self.content_ = DataLoader().readContent(content)
+        self._cleanContent()
+
+        if cachePath is not None:
+            with self.instrumentation.stage('ContentRecommender', '_saveContentCache'):
+                self._saveContentCache(cachePath)
+
+    def fitProfiles(self, ratings, content):
+        """ Essa função prepara o conteúdo e calcula os perfis dos usuários a partir do histórico de notas, sem
+            pontuar targets. Depois dela, novas notas são incorporadas por `updateProfiles` e novos targets pontuados
+            por `scoreTargets`. O conteúdo pode ser um dataframe ou o caminho do arquivo .jsonl.
+
+        Returns:
+        -----------
+            self (ContentRecommender): O próprio recomendador com os perfis calculados
+
+        """
+        self.ratings_ = ratings
+
+        self._prepareContent(content)
+
+        with self.instrumentation.stage('ContentRecommender', '_mergeRawData'):
+            self._mergeRawData()
+
+        with self.instrumentation.stage('ContentRecommender', '_calculateGrade'):
+            self._calculateGrade()
+
+        with self.instrumentation.stage('ContentRecommender', '_buildUserProfiles'):
+            self._buildUserProfiles()
+
+        return self
+
+    def updateProfiles(self, newRatings):
+        """ Essa função incorpora novas notas aos perfis guardados, somando-as às somas e às contagens apenas dos
+            usuários afetados, sem reler o histórico. Usuários novos recebem um perfil e notas de itens sem dados
+            são descartadas. O histórico em ratings_ não é alterado.
+
+        Parameters:
+        -----------
+            newRatings (pandas dataframe): Novas notas com as colunas UserId, ItemId e Rating
+
+        Returns:
+        -----------
+            self (ContentRecommender): O próprio recomendador atualizado
+
+        """
+        ratings = self._gradeNewRatings(newRatings)
+
+        newUsers = pd.Index(ratings['UserId'].unique()).difference(self.userIndex_)
+
+        if len(newUsers):
+            self.userIndex_ = self.userIndex_.append(newUsers)
+            self.profileSums_ = np.vstack([self.profileSums_, np.zeros((len(newUsers), len(self.genres_)))])
+            self.userProfiles_ = np.vstack([self.userProfiles_, np.zeros((len(newUsers), len(self.genres_)))])
+            self.ratingCounts_ = np.concatenate([self.ratingCounts_, np.zeros(len(newUsers), dtype=self.ratingCounts_.dtype)])
+            self.userNorms_ = np.concatenate([self.userNorms_, np.zeros(len(newUsers))])
+
+        users = self.userIndex_.get_indexer(ratings['UserId'])
+        positions, genres = self._expandItemGenres(ratings['ItemIndex'].to_numpy())
+
+        np.add.at(self.profileSums_, (users[positions], genres), ratings['Grade'].to_numpy(dtype=float)[positions])
+        np.add.at(self.ratingCounts_, users, 1)
+
+        self._refreshProfiles(np.unique(users))
+
+        return self
+
+    def scoreTargets(self, targets):
+        """ Essa função calcula a similaridade de pares (usuário, item) com os perfis guardados, em lotes de
+            `targetBatchSize` pares. Pares de usuários sem avaliações são descartados.
+
+        Returns:
+        -----------
+            similarities (pandas dataframe): Pares com as features dos itens e a similaridade
+
+        """
+        similarities = [self._scoreTargets(targets.iloc[start:start + self.targetBatchSize])
+                        for start in range(0, max(len(targets), 1), self.targetBatchSize)]
+
+        return pd.concat(similarities, ignore_index=True)
 
-        self.semilarities_ = similarities
-    
     def getPredictions(self, ratings, content, targets):
         """ Essa função realiza as chamadas às funções que executam cada passo da recomendação baseada em conteúdo. Ela retorna
-            um dataframe que contem os pares usuários-itens e a similaridade entre eles.
+            um dataframe que contem os pares usuários-itens e a similaridade entre eles. O conteúdo pode ser um dataframe
+            ou o caminho do arquivo .jsonl, que permite o uso do cache em cacheDir.
         """
 
-        self.content_ = content
-        self.ratings_ = ratings
         self.targets_ = targets
 
-        self._correctContentData()
-        self._transformGenresIntoColumns()
-        self._mergeRawData()
-        self._calculateGrade()
-        self._generateSimilarities()
+        self.fitProfiles(ratings, content)
+
+        with self.instrumentation.stage('ContentRecommender', '_generateSimilarities'):
+            self._generateSimilarities()
 
         return self.semilarities_
 
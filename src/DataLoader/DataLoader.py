@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+from pandas.api.types import union_categoricals
+
+class DataLoader:
+    def __init__(self, chunkSize=500000):
+        """ Essa classe implementa a leitura dos arquivos de notas, conteúdo e targets. Os arquivos são lidos em
+            blocos e convertidos para tipos compactos: os ids de usuários e itens viram colunas categóricas, com as
+            mesmas categorias entre os arquivos, e as notas e timestamps viram inteiros do menor tipo possível.
+
+        Attributes:
+        -----------
+            chunkSize (int): Número de linhas lidas de cada vez dos arquivos .jsonl
+
+        """
+        self.chunkSize = chunkSize
+
+    def _compactChunk(self, chunk, idColumns, intColumns):
+        """ Essa função converte as colunas de ids de um bloco lido para categóricas e as colunas inteiras para o
+            menor tipo inteiro que comporta os seus valores.
+        """
+        for column in idColumns:
+            chunk[column] = chunk[column].astype('category')
+
+        for column in intColumns:
+            chunk[column] = pd.to_numeric(chunk[column], downcast='integer')
+
+        return chunk
+
+    def _concatChunks(self, chunks, idColumns):
+        """ Essa função junta os blocos lidos em um único dataframe, unindo as categorias das colunas de ids.
+        """
+        idValues = {column: union_categoricals([chunk[column] for chunk in chunks]) for column in idColumns}
+
+        columns = chunks[0].columns
+        dataFrame = pd.concat([chunk.drop(idColumns, axis=1) for chunk in chunks], ignore_index=True)
+
+        for column in idColumns:
+            dataFrame[column] = idValues[column]
+
+        return dataFrame[columns]
+
+    def _readJsonLines(self, path, idColumns, intColumns=(), dtype=None):
+        """ Essa função lê um arquivo .jsonl em blocos de chunkSize linhas, compactando cada bloco antes de ler o
+            próximo.
+        """
+        with open(path, 'r') as f:
+            reader = pd.read_json(f, lines=True, chunksize=self.chunkSize, dtype=dtype, convert_dates=False)
+            chunks = [self._compactChunk(chunk, idColumns, intColumns) for chunk in reader]
+
+        return self._concatChunks(chunks, idColumns)
+
+    def _alignCategories(self, dataFrames, column):
+        """ Essa função faz com que uma coluna de ids tenha as mesmas categorias, ordenadas, em todos os
+            dataframes, para que junções e ordenações por ela se comportem como nas colunas de texto.
+        """
+        categories = union_categoricals([dataFrame[column] for dataFrame in dataFrames], sort_categories=True).categories
+
+        for dataFrame in dataFrames:
+            dataFrame[column] = dataFrame[column].cat.set_categories(categories)
+
+    def readRatings(self, path):
+        """ Essa função lê o arquivo .jsonl de notas, com as colunas UserId, ItemId, Rating e Timestamp.
+        """
+        return self._readJsonLines(path, idColumns=['UserId', 'ItemId'], intColumns=['Rating', 'Timestamp'],
+                                   dtype={'UserId': str, 'ItemId': str})
+
+    def iterRatings(self, path):
+        """ Essa função lê o arquivo .jsonl de notas em blocos de chunkSize linhas, entregando cada bloco sem juntá-los,
+            para que notas maiores que a memória sejam processadas uma parte de cada vez.
+        """
+        with open(path, 'r') as f:
+            reader = pd.read_json(f, lines=True, chunksize=self.chunkSize, dtype={'UserId': str, 'ItemId': str},
+                                  convert_dates=False)
+
+            for chunk in reader:
+                yield self._compactChunk(chunk, ['UserId', 'ItemId'], ['Rating', 'Timestamp'])
+
+    def readContent(self, path):
+        """ Essa função lê o arquivo .jsonl de conteúdo. Os campos de conteúdo são mantidos como texto, para a
+            correção feita pelo recomendador baseado em conteúdo.
+        """
+        return self._readJsonLines(path, idColumns=['ItemId'], dtype=False)
+
+    def readTargets(self, path):
+        """ Essa função lê o arquivo .csv de targets, com as colunas UserId e ItemId.
+        """
+        return pd.read_csv(path, sep=',', dtype={'UserId': 'category', 'ItemId': 'category'})
+
+    def read(self, ratingsPath, contentPath, targetsPath):
+        """ Essa função lê os três arquivos de entrada e alinha as categorias dos ids entre eles. Se contentPath não
+            for definido o conteúdo não é lido, por exemplo quando ele vem do cache do recomendador de conteúdo.
+
+        Returns:
+        -----------
+            ratings (pandas dataframe): Notas de usuários para itens
+
+            content (pandas dataframe): Dados de conteúdo dos itens, ou None
+
+            targets (pandas dataframe): Pares (usuário, item) para predição
+
+        """
+        ratings = self.readRatings(ratingsPath)
+        content = None if contentPath is None else self.readContent(contentPath)
+        targets = self.readTargets(targetsPath)
+
+        self._alignCategories([ratings, targets], 'UserId')
+        self._alignCategories([frame for frame in [ratings, content, targets] if frame is not None], 'ItemId')
+
+        return ratings, content, targets
+
+    def splitTrainingValidation(self, ratings, trainingFraction=0.8, randomState=8):
+        """ Essa função separa as notas em treino e validação por uma máscara booleana. A amostra de treino tem
+            as mesmas linhas de `ratings.sample(frac=trainingFraction, random_state=randomState)`.
+
+        Returns:
+        -----------
+            training (pandas dataframe): Notas de treino, com as colunas UserId, ItemId e Rating
+
+            validation (pandas dataframe): Notas de validação
+
+        """
+        nTraining = int(round(trainingFraction * len(ratings)))
+        sample = np.random.RandomState(randomState).choice(len(ratings), nTraining, replace=False)
+
+        isTraining = np.zeros(len(ratings), dtype=bool)
+        isTraining[sample] = True
+
+        return ratings.loc[isTraining, ['UserId', 'ItemId', 'Rating']], ratings[~isTraining]
@@ -0,0 +1 @@
+from .DataLoader import DataLoader
\ No newline at end of file
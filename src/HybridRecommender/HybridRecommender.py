@@ -1,54 +1,162 @@
+from contextlib import ExitStack
+
+import numpy as np
 import pandas as pd
 
+from ..Instrumentation.Instrumentation import Instrumentation
+from ..OutputWriter.OutputWriter import OutputWriter
+from ..RatingScale.RatingScale import RatingScale
+
 class HybridRecommender:
-    def __init__(self):
+    def __init__(self, topN=None, instrumentation=None):
         """ Esse classe implementa um recomendador híbrido que combina prediçãos baseada em conteúdo, predições colaborativas e 
             features não personalizadas.
-        """
-        pass
 
-    def _replaceRatings(self, row):
-        """ Essa função substitui uma nota pela escala correspondente a essa nota conforme a métrica estabelecida.
+        Attributes:
+        -----------
+            topN (int): Número máximo de itens recomendados por usuário. Se não definido, todos os pares são
+            ordenados e retornados
+
+            instrumentation (Instrumentation): Registra o tempo e a memória de cada etapa. Se não definida, nada é
+            medido
         """
-        if row['Rating'] == 10: 
-            grade = 3
-        elif row['Rating'] > 7: 
-            grade = 2
-        elif row['Rating'] > 5: 
-            grade = 1
-        else:
-            grade = 0
-        return grade
+        self.topN = topN
+        self.instrumentation = instrumentation or Instrumentation.disabled()
 
     def _ajustCollaborativeData(self):
         """ Essa função ajusta as notas preditas para a escala de notas positivas e negativas (entre 0 e 4)
         """
-        self.cfPredictions_['Rating'] = self.cfPredictions_['Predictions']
-        self.cfPredictions_['PredictionGrade'] = self.cfPredictions_.apply(self._replaceRatings, axis=1)
-        self.cfPredictions_ = self.cfPredictions_.drop(['Predictions', 'Rating'], axis=1)
-    
-    def getPredictions(self, cfPredictions, cbPredictions, saveToFile=False, printOnConsole=True):
+        self.cfPredictions_ = self.cfPredictions_.assign(PredictionGrade=RatingScale.grade(self.cfPredictions_['Predictions'].to_numpy()))
+        self.cfPredictions_ = self.cfPredictions_.drop(['Predictions'], axis=1)
+
+    def _denseRank(self, keys):
+        """ Essa função calcula o posto denso das linhas formadas pelas chaves, da menos para a mais significativa, em
+            ordem crescente. Linhas iguais recebem o mesmo posto e valores nan ficam com o menor posto.
+        """
+        keys = [np.where(np.isnan(key), -np.inf, key) for key in keys]
+        order = np.lexsort(keys)
+
+        changes = np.zeros(len(order), dtype=bool)
+        for key in keys:
+            changes[1:] |= key[order][1:] != key[order][:-1]
+
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[order] = np.cumsum(changes)
+
+        return ranks
+
+    def _buildRankingKey(self):
+        """ Essa função compacta as chaves de ordenação das recomendações (Similarity, imdbVotes, BoxOffice, Metascore,
+            imdbRating e PredictionGrade) em uma única chave inteira, maior para as melhores recomendações. As features
+            não personalizadas são do item, então o seu posto é calculado apenas sobre os itens distintos.
+        """
+        itemCodes, itemIds = pd.factorize(self.reccomendations_['ItemId'])
+        firstRows = np.full(len(itemIds), len(itemCodes))
+        np.minimum.at(firstRows, itemCodes, np.arange(len(itemCodes)))
+
+        itemFeatures = [self.reccomendations_[feature].to_numpy(dtype=float)[firstRows]
+                        for feature in ['imdbRating', 'Metascore', 'BoxOffice', 'imdbVotes']]
+        itemRanks = self._denseRank(itemFeatures)[itemCodes]
+        similarityRanks = self._denseRank([self.reccomendations_['Similarity'].to_numpy(dtype=float)])
+
+        grades = self.reccomendations_['PredictionGrade'].to_numpy()
+
+        return (similarityRanks * (itemRanks.max(initial=0) + 1) + itemRanks) * 4 + grades
+
+    def _iterTopN(self, userCodes, keys, userBlockSize=65536):
+        """ Essa função seleciona, para cada usuário, as topN recomendações de maior chave, mantendo a ordem original
+            entre chaves iguais. Os usuários são percorridos em blocos consecutivos de userBlockSize e, em cada bloco,
+            agrupados pelo tamanho da sua lista em faixas de potências de 2. Em cada faixa as listas são alinhadas em
+            uma matriz e selecionadas por seleção parcial linha a linha, sem uma ordenação global.
+
+        Returns:
+        -----------
+            selected (generator): Linhas selecionadas de cada bloco de usuários, ordenadas por usuário e posição na
+            recomendação
+        """
+        order = np.argsort(userCodes, kind='stable')
+        counts = np.bincount(userCodes)
+        starts = np.r_[0, np.cumsum(counts)[:-1]]
+        maxKey = keys.max(initial=0) + 1
+
+        for blockStart in range(0, len(counts), userBlockSize):
+            users = blockStart + np.flatnonzero(counts[blockStart:blockStart + userBlockSize])
+            buckets = np.ceil(np.log2(counts[users])).astype(np.int64)
+            selectedRows, selectedKeys = [], []
+
+            for bucket in np.unique(buckets):
+                bucketUsers = users[buckets == bucket]
+                width = counts[bucketUsers].max()
+                top = width if self.topN is None else min(self.topN, width)
+
+                columns = np.arange(width)
+                valid = columns < counts[bucketUsers][:, np.newaxis]
+                rows = order[np.minimum(starts[bucketUsers][:, np.newaxis] + columns, len(order) - 1)]
+
+                if maxKey > np.iinfo(np.int64).max // width:
+                    keys = self._denseRank([keys.astype(float)])
+                    maxKey = keys.max(initial=0) + 1
+
+                bucketKeys = np.where(valid, keys[rows] * width + (width - 1 - columns), -1)
+
+                chosen = np.argpartition(-bucketKeys, top - 1, axis=1)[:, :top]
+                chosenKeys = np.take_along_axis(bucketKeys, chosen, axis=1)
+                ranking = np.argsort(-chosenKeys, axis=1)
+                chosen = np.take_along_axis(chosen, ranking, axis=1)
+                chosenKeys = np.take_along_axis(chosenKeys, ranking, axis=1)
+
+                selected = chosenKeys > -1
+                selectedRows.append(np.take_along_axis(rows, chosen, axis=1)[selected])
+                selectedKeys.append((bucketUsers[:, np.newaxis] * counts.max() + np.arange(top))[selected])
+
+            if selectedRows:
+                selectedRows = np.concatenate(selectedRows)
+                yield selectedRows[np.argsort(np.concatenate(selectedKeys), kind='stable')]
+
+    def getPredictions(self, cfPredictions, cbPredictions, saveToFile=False, printOnConsole=True, outputPath='submission.csv', output=None):
         """ Essa função realiza a união das recomendações colaborativas, de conteúdo e não personalizadas para gerar
-            recomendações para o usuário.
+            recomendações para o usuário. Para cada usuário são mantidas as topN recomendações, ordenadas pela
+            similaridade ponderada pelos votos e, nos empates, pelas features não personalizadas e pela escala da nota
+            predita. As recomendações são gravadas em outputPath quando saveToFile é verdadeiro, na saída padrão quando
+            printOnConsole é verdadeiro e no OutputWriter output quando definido, bloco a bloco de usuários, à
+            medida que são selecionadas.
         """
 
         self.cfPredictions_ = cfPredictions
         self.cbPredictions_ = cbPredictions
 
-        self._ajustCollaborativeData()
+        with self.instrumentation.stage('HybridRecommender', '_ajustCollaborativeData'):
+            self._ajustCollaborativeData()
+
+        with self.instrumentation.stage('HybridRecommender', 'merge'):
+            self.reccomendations_ = pd.merge(self.cfPredictions_ , self.cbPredictions_, on=['UserId', 'ItemId'])
+            self.reccomendations_['Similarity'] = self.reccomendations_['Similarity']*self.reccomendations_['imdbVotes']
+
+        blocks = []
+
+        with ExitStack() as stack, self.instrumentation.stage('HybridRecommender', '_selectTopN'):
+            writers = [] if output is None else [output]
+
+            if saveToFile:
+                writers.append(stack.enter_context(OutputWriter(outputPath)))
+
+            if printOnConsole:
+                writers.append(stack.enter_context(OutputWriter('-')))
+
+            userCodes, _ = pd.factorize(self.reccomendations_['UserId'], sort=True)
+
+            for selected in self._iterTopN(userCodes, self._buildRankingKey()):
+                block = self.reccomendations_[['UserId', 'ItemId']].iloc[selected]
+
+                for writer in writers:
+                    writer.write(block)
+
+                blocks.append(block)
 
-        self.reccomendations_ = pd.merge(self.cfPredictions_ , self.cbPredictions_, on=['UserId', 'ItemId'])
-        self.reccomendations_['Similarity'] = self.reccomendations_['Similarity']*self.reccomendations_['imdbVotes']
-        self.reccomendations_ = self.reccomendations_.sort_values(['UserId','Similarity','imdbVotes','BoxOffice','Metascore','imdbRating','PredictionGrade'], ascending=[True, False, False, False, False, False, False])
-        output = self.reccomendations_[['UserId', 'ItemId']].copy()
+            if not blocks:
+                blocks.append(pd.DataFrame(columns=['UserId', 'ItemId']))
 
-        if saveToFile:
-            output.to_csv('submission.csv', index=False, sep=',')
-        
-        if printOnConsole:
-            pd.set_option("display.max_rows", None, "display.max_columns", None)
-            output = output.to_numpy()
-            print('UserId,','ItemId')
-            for user, item in output:
-                print(user, item, sep=',')
+                for writer in writers:
+                    writer.write(blocks[0])
 
+        return pd.concat(blocks).reset_index(drop=True)
@@ -0,0 +1,217 @@
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ..CollaborativeRecommender.CollaborativeRecommender import CollaborativeRecommender
+from ..SharedArrays.SharedArrays import SharedArrays
+
+class HyperparameterSearch:
+    encodingParams = ('compact', 'validationSampleSize')
+
+    def __init__(self, paramGrid=None, paramRanges=None, nIterations=20, baseParams=None, nJobs=None, pruneMargin=0.02,
+                 pruneAfter=2, seed=13):
+        """ Essa classe busca os hiperparâmetros do CollaborativeRecommender. Os dados de treino e validação são
+            mapeados uma única vez e compartilhados, somente para leitura, pela memória compartilhada com um conjunto
+            de processos que treinam as configurações ao mesmo tempo. Ao fim de cada passada o RMSE de validação de
+            uma configuração é comparado com o melhor RMSE já visto na mesma passada por qualquer configuração, e ela
+            é interrompida se estiver pior por mais que pruneMargin.
+
+        Attributes:
+        -----------
+            paramGrid (dict): Lista de valores de cada hiperparâmetro, combinados em uma grade completa
+
+            paramRanges (dict): Intervalo (mínimo, máximo) ou lista de valores de cada hiperparâmetro, sorteados em
+            nIterations configurações. Intervalos de inteiros são sorteados como inteiros. Usado quando paramGrid não
+            é definido
+
+            nIterations (int): Número de configurações sorteadas de paramRanges
+
+            baseParams (dict): Hiperparâmetros fixos de todas as configurações. Os que mudam o mapeamento dos dados,
+            compact e validationSampleSize, só podem ser definidos aqui
+
+            nJobs (int): Número de processos. Se não definido, o número de CPUs
+
+            pruneMargin (float): Fração em que o RMSE de uma passada pode superar o melhor da mesma passada antes
+            de a configuração ser interrompida
+
+            pruneAfter (int): Número de passadas de cada configuração antes que ela possa ser interrompida
+
+            seed (int): Semente do sorteio das configurações
+
+        """
+        if paramGrid is None and paramRanges is None:
+            raise ValueError('paramGrid ou paramRanges deve ser definido')
+
+        encodingParams = sorted(set(paramGrid or paramRanges).intersection(self.encodingParams))
+
+        if encodingParams:
+            raise ValueError('os dados são mapeados uma única vez, então ' + ', '.join(encodingParams) +
+                             ' deve ser definido em baseParams')
+
+        self.paramGrid = paramGrid
+        self.paramRanges = paramRanges
+        self.nIterations = nIterations
+        self.baseParams = baseParams or {}
+        self.nJobs = nJobs or os.cpu_count()
+        self.pruneMargin = pruneMargin
+        self.pruneAfter = pruneAfter
+        self.seed = seed
+
+    def _sample(self, values, random):
+        """ Essa função sorteia um valor de uma lista ou de um intervalo (mínimo, máximo).
+        """
+        if isinstance(values, list):
+            return values[random.randint(len(values))]
+
+        low, high = values
+
+        if isinstance(low, int) and isinstance(high, int):
+            return int(random.randint(low, high + 1))
+
+        return float(random.uniform(low, high))
+
+    def _candidates(self):
+        """ Essa função lista as configurações avaliadas, já com os hiperparâmetros fixos.
+        """
+        if self.paramGrid is not None:
+            names = list(self.paramGrid)
+            combinations = [dict(zip(names, values)) for values in itertools.product(*self.paramGrid.values())]
+        else:
+            random = np.random.RandomState(self.seed)
+            combinations = [{name: self._sample(values, random) for name, values in self.paramRanges.items()}
+                            for iteration in range(self.nIterations)]
+
+        candidates = [dict(self.baseParams, **combination) for combination in combinations]
+
+        for params in candidates:
+            if params.get('engine') == 'hogwild' and params.get('nJobs', 1) > 1:
+                raise ValueError("o motor 'hogwild' com nJobs > 1 não pode rodar dentro dos processos da busca")
+
+        return candidates
+
+    @staticmethod
+    def _evaluate(params, globalMean, descriptor, pruneMargin, pruneAfter):
+        """ Essa função é executada em cada processo: treina uma configuração sobre os dados compartilhados e
+            atualiza o melhor RMSE de cada passada, também compartilhado. A atualização não usa travas, então uma
+            configuração pode ser comparada com um melhor RMSE um pouco defasado, o que só atrasa a sua interrupção.
+
+        Returns:
+        -----------
+            result (dict): RMSE de cada passada, melhor RMSE, se foi interrompida, tempo e os bias e fatores
+            aprendidos quando ela terminou sem ser interrompida
+
+        """
+        shared = SharedArrays.attach(descriptor)
+        bestRMSE = shared['bestRMSE']
+        pruned = []
+
+        def epochCallback(epoch, rmse):
+            if np.isnan(rmse):
+                return True
+
+            if rmse < bestRMSE[epoch]:
+                bestRMSE[epoch] = rmse
+
+            if epoch + 1 >= pruneAfter and rmse > bestRMSE[epoch] * (1 + pruneMargin):
+                pruned.append(epoch)
+                return False
+
+            return True
+
+        try:
+            recommender = CollaborativeRecommender(**params)
+            recommender.training_ = shared['training']
+            recommender.validation_ = shared['validation']
+            recommender.globalMean_ = globalMean
+
+            start = time.perf_counter()
+            recommender._learnFactors(epochCallback)
+            seconds = time.perf_counter() - start
+        finally:
+            shared.close()
+
+        rmse = recommender.validationRMSE_[:recommender.epochsRun_, 0]
+
+        result = {
+            'validationRMSE': rmse,
+            'bestRMSE': float(np.nanmin(rmse)) if np.isfinite(rmse).any() else np.nan,
+            'epochs': recommender.epochsRun_,
+            'pruned': bool(pruned),
+            'seconds': seconds,
+        }
+
+        if not pruned:
+            result['factors'] = (recommender.bu_, recommender.bi_, recommender.pu_, recommender.qi_)
+
+        return result
+
+    def search(self, training, validation):
+        """ Essa função avalia todas as configurações e monta o recomendador da melhor, pronto para o `predict`.
+
+        Parameters:
+        -----------
+            training (pandas dataframe): Dados de treino com as notas de usuário para itens.
+
+            validation (pandas dataframe): Dados de validação com as notas de usuário para itens.
+
+        Attributes:
+        -----------
+            results_ (pandas dataframe): Uma linha por configuração, com os hiperparâmetros, o melhor RMSE de
+            validação, o número de passadas, se foi interrompida e o tempo, ordenada do melhor para o pior RMSE
+
+            bestParams_ (dict): Hiperparâmetros da melhor configuração
+
+            bestModel_ (CollaborativeRecommender): Recomendador treinado com a melhor configuração
+
+        Returns:
+        -----------
+            self (HyperparameterSearch): A própria busca concluída
+
+        """
+        candidates = self._candidates()
+
+        encoder = CollaborativeRecommender(**self.baseParams)
+        encoder._encodeData(training, validation)
+
+        maxEpochs = max(params.get('nEpochs', encoder.nEpochs) for params in candidates)
+        shared = SharedArrays.create({'training': encoder.training_, 'validation': encoder.validation_,
+                                      'bestRMSE': np.full(maxEpochs, np.inf)})
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.nJobs) as executor:
+                futures = [executor.submit(HyperparameterSearch._evaluate, params, encoder.globalMean_, shared.descriptor(),
+                                           self.pruneMargin, self.pruneAfter) for params in candidates]
+                results = [future.result() for future in futures]
+        finally:
+            shared.close()
+
+        self.results_ = pd.DataFrame([dict(params, **{name: result[name] for name in ['bestRMSE', 'epochs', 'pruned', 'seconds']})
+                                      for params, result in zip(candidates, results)])
+        self.results_ = self.results_.sort_values('bestRMSE', kind='stable').reset_index(drop=True)
+
+        finished = [position for position, result in enumerate(results) if 'factors' in result]
+        best = min(finished, key=lambda position: results[position]['bestRMSE'])
+
+        self.bestParams_ = candidates[best]
+        self.bestModel_ = self._buildModel(encoder, candidates[best], results[best])
+
+        return self
+
+    def _buildModel(self, encoder, params, result):
+        """ Essa função monta o recomendador da melhor configuração com os mapeamentos e os dados do encoder e os
+            bias e fatores aprendidos no processo que a treinou.
+        """
+        recommender = CollaborativeRecommender(**params)
+
+        for name in ['userMapping_', 'itemMapping_', 'training_', 'validation_', 'fullValidation_', 'globalMean_']:
+            setattr(recommender, name, getattr(encoder, name))
+
+        recommender.bu_, recommender.bi_, recommender.pu_, recommender.qi_ = result['factors']
+        recommender.validationRMSE_ = result['validationRMSE'][:, np.newaxis]
+        recommender.epochsRun_ = result['epochs']
+
+        return recommender
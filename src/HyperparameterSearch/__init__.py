@@ -0,0 +1 @@
+from .HyperparameterSearch import HyperparameterSearch
\ No newline at end of file
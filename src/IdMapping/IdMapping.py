@@ -0,0 +1,93 @@
+import numpy as np
+
+class IdMapping:
+    def __init__(self, ids):
+        """ Essa classe mapeia ids para índices inteiros com arrays do NumPy, como alternativa compacta ao dicionário
+            de ids: os ids ficam em um array na ordem dos índices e a busca é feita por `np.searchsorted` em uma cópia
+            ordenada. Ela oferece as operações do dicionário usadas pelo CollaborativeRecommender: len, iteração pelos
+            ids na ordem dos índices, in e get.
+
+        Attributes:
+        -----------
+            ids (array): Ids distintos, na ordem dos seus índices
+
+            ids_ (numpy array): Ids na ordem dos índices
+
+            sortedIds_ (numpy array): Ids ordenados
+
+            sortedIndexes_ (numpy array): Índice de cada id de sortedIds_
+
+        """
+        self.ids_ = self._asArray(ids)
+        self._sort()
+
+    def _asArray(self, ids):
+        """ Essa função converte os ids para um array de tipo fixo, trocando arrays de objetos por strings ou
+            números, que são comparados sem objetos do Python.
+        """
+        ids = np.asarray(ids)
+
+        return np.array(ids.tolist()) if ids.dtype == object and len(ids) else ids
+
+    def _sort(self):
+        """ Essa função monta a cópia ordenada dos ids usada nas buscas.
+        """
+        self.sortedIndexes_ = np.argsort(self.ids_, kind='stable').astype(np.int32)
+        self.sortedIds_ = self.ids_[self.sortedIndexes_]
+
+    def lookup(self, ids):
+        """ Essa função converte um array de ids para os seus índices de uma só vez.
+
+        Returns:
+        -----------
+            indexes (numpy array): Índices dos ids, ou -1 para os ids desconhecidos
+
+        """
+        ids = self._asArray(ids)
+
+        if len(self.sortedIds_) == 0 or len(ids) == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+
+        positions = np.minimum(np.searchsorted(self.sortedIds_, ids), len(self.sortedIds_) - 1)
+        found = self.sortedIds_[positions] == ids
+
+        return np.where(found, self.sortedIndexes_[positions], -1).astype(np.int64)
+
+    def extend(self, ids):
+        """ Essa função acrescenta ids ainda desconhecidos, com índices a partir do fim do mapeamento atual. Apenas
+            os novos ids são ordenados, e então intercalados na cópia ordenada por `np.searchsorted`.
+        """
+        ids = self._asArray(ids)
+
+        if len(ids) == 0:
+            return
+
+        if len(self.ids_) == 0:
+            self.ids_ = ids
+            self._sort()
+            return
+
+        order = np.argsort(ids, kind='stable')
+        newIds = ids[order]
+        positions = np.searchsorted(self.sortedIds_, newIds)
+        idType = np.result_type(self.sortedIds_, newIds)
+
+        self.sortedIds_ = np.insert(self.sortedIds_.astype(idType, copy=False), positions, newIds)
+        self.sortedIndexes_ = np.insert(self.sortedIndexes_, positions, (len(self.ids_) + order).astype(np.int32))
+        self.ids_ = np.concatenate([self.ids_, ids])
+
+    def get(self, id, default=None):
+        """ Essa função retorna o índice de um único id, ou default se ele for desconhecido.
+        """
+        index = self.lookup([id])[0]
+
+        return default if index < 0 else int(index)
+
+    def __contains__(self, id):
+        return self.lookup([id])[0] > -1
+
+    def __len__(self):
+        return len(self.ids_)
+
+    def __iter__(self):
+        return iter(self.ids_.tolist())
@@ -0,0 +1 @@
+from .IdMapping import IdMapping
\ No newline at end of file
@@ -0,0 +1,184 @@
+import contextlib
+import json
+import math
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+class Instrumentation:
+    def __init__(self, enabled=True, logPath=None, traceMemory=True):
+        """ Essa classe registra o tempo e a memória das etapas dos recomendadores e a telemetria de cada passada do
+            treino colaborativo. Os recomendadores recebem uma instância no construtor e envolvem as suas etapas em
+            `stage`. Desabilitada, `stage` retorna sempre o mesmo contexto vazio e `epoch` retorna de imediato, então
+            ela pode ficar ligada em produção.
+
+        Attributes:
+        -----------
+            enabled (bool): Se falso nada é medido nem registrado
+
+            logPath (str): Arquivo JSON lines onde cada registro é acrescentado assim que é feito, - para a saída de
+            erros
+
+            traceMemory (bool): Se verdadeiro o pico de memória alocada em cada etapa é medido com o tracemalloc, que
+            deixa as etapas mais lentas. O pico de memória residente do processo é sempre registrado
+
+            stages_ (list): Registros das etapas, com componente, nome, tempo e memória
+
+            epochs_ (list): Registros das passadas do treino, com tempo, notas por segundo e RMSE de validação
+
+        """
+        self.enabled = enabled
+        self.logPath = logPath
+        self.traceMemory = traceMemory
+        self.stages_ = []
+        self.epochs_ = []
+        self.log_ = None
+
+    @classmethod
+    def disabled(cls):
+        """ Essa função retorna uma instrumentação desabilitada, usada pelos recomendadores quando nenhuma é passada.
+        """
+        return _DISABLED
+
+    def _maxResidentBytes(self):
+        """ Essa função retorna o pico de memória residente do processo até o momento, ou None se o módulo resource
+            não estiver disponível.
+        """
+        if resource is None:
+            return None
+
+        maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        return maxRss if sys.platform == 'darwin' else maxRss * 1024
+
+    def _write(self, record):
+        """ Essa função acrescenta um registro ao log JSON lines, quando definido.
+        """
+        if self.logPath is None:
+            return
+
+        if self.log_ is None:
+            self.log_ = sys.stderr if self.logPath == '-' else open(self.logPath, 'a')
+
+        self.log_.write(json.dumps(record) + '\n')
+        self.log_.flush()
+
+    def stage(self, component, name):
+        """ Essa função retorna o contexto que mede uma etapa: o tempo de parede, o pico de memória alocada dentro
+            dela e o pico de memória residente do processo ao seu fim.
+
+        Parameters:
+        -----------
+            component (str): Nome do recomendador, por exemplo CollaborativeRecommender
+
+            name (str): Nome da etapa, por exemplo _learnFactors
+
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+
+        return self._measureStage(component, name)
+
+    @contextlib.contextmanager
+    def _measureStage(self, component, name):
+        """ Essa função mede a etapa envolvida pelo contexto. Se o tracemalloc já estiver ligado, por uma etapa
+            externa ou pelo chamador, apenas o seu pico é reiniciado.
+        """
+        startedTracing = False
+
+        if self.traceMemory:
+            startedTracing = not tracemalloc.is_tracing()
+
+            if startedTracing:
+                tracemalloc.start()
+            else:
+                tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peakBytes = None
+
+            if self.traceMemory:
+                peakBytes = tracemalloc.get_traced_memory()[1]
+
+                if startedTracing:
+                    tracemalloc.stop()
+
+            record = {'type': 'stage', 'component': component, 'stage': name, 'seconds': seconds,
+                      'peakTracedBytes': peakBytes, 'maxResidentBytes': self._maxResidentBytes()}
+
+            self.stages_.append(record)
+            self._write(record)
+
+    def epoch(self, component, epoch, seconds, nRatings, validationRMSE=None):
+        """ Essa função registra uma passada do treino: o seu tempo, as notas processadas por segundo e o RMSE de
+            validação, None nas passadas sem validação.
+        """
+        if not self.enabled:
+            return
+
+        if validationRMSE is not None and math.isnan(validationRMSE):
+            validationRMSE = None
+
+        record = {'type': 'epoch', 'component': component, 'epoch': epoch, 'seconds': seconds,
+                  'ratingsPerSecond': nRatings / seconds if seconds > 0 else None, 'validationRMSE': validationRMSE}
+
+        self.epochs_.append(record)
+        self._write(record)
+
+    def metrics(self):
+        """ Essa função retorna as métricas registradas até o momento, com o total de tempo de cada etapa.
+
+        Returns:
+        -----------
+            metrics (dict): Registros das etapas e das passadas e o tempo total por etapa
+
+        """
+        totals = {}
+
+        for record in self.stages_:
+            key = record['component'] + '.' + record['stage']
+            totals[key] = totals.get(key, 0.0) + record['seconds']
+
+        return {'stages': list(self.stages_), 'epochs': list(self.epochs_), 'totalSeconds': totals}
+
+    def merge(self, metrics):
+        """ Essa função acrescenta os registros de outra instrumentação, por exemplo a de um processo filho, que já
+            os gravou no log.
+        """
+        if not self.enabled:
+            return
+
+        self.stages_.extend(metrics['stages'])
+        self.epochs_.extend(metrics['epochs'])
+
+    def close(self):
+        """ Essa função fecha o arquivo do log, quando aberto.
+        """
+        if self.log_ is not None and self.log_ is not sys.stderr:
+            self.log_.close()
+
+        self.log_ = None
+
+    def __getstate__(self):
+        """ O arquivo do log não é copiado para outros processos, que o abrem de novo no primeiro registro.
+        """
+        return dict(self.__dict__, log_=None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+_NULL_STAGE = contextlib.nullcontext()
+_DISABLED = Instrumentation(enabled=False)
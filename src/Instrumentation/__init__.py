@@ -0,0 +1 @@
+from .Instrumentation import Instrumentation
\ No newline at end of file
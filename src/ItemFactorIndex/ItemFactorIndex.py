@@ -0,0 +1,308 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+class ItemFactorIndex:
+    def __init__(self, nLists=None, nProbe=8, nIterations=20, seed=13):
+        """ Essa classe implementa um índice aproximado (IVF) para a busca dos itens de maior nota predita de um
+            usuário, sem pontuar todo o catálogo. A nota de um item é o produto interno entre [pu, 1] e [qi, bi], e
+            para que a busca pelo maior produto interno vire uma busca pelo vizinho mais próximo cada vetor de item
+            recebe uma coordenada extra que iguala as normas. Os itens são agrupados pelo k-means em nLists listas e
+            cada consulta pontua apenas os itens das nProbe listas com centróides mais próximos. Mais listas sondadas
+            aumentam a revocação e o custo da consulta.
+
+        Attributes:
+        -----------
+            nLists (int): Número de listas do índice. Se não definido, a raiz quadrada do número de itens
+
+            nProbe (int): Número de listas sondadas em cada consulta
+
+            nIterations (int): Número de iterações do k-means
+
+            seed (int): Semente da inicialização do k-means
+
+        """
+        self.nLists = nLists
+        self.nProbe = nProbe
+        self.nIterations = nIterations
+        self.seed = seed
+
+    def _itemVectors(self, recommender):
+        """ Essa função monta os vetores [qi, bi] dos itens do recomendador colaborativo.
+        """
+        return np.hstack([recommender.qi_, np.asarray(recommender.bi_)[:, np.newaxis]])
+
+    def _transform(self, vectors):
+        """ Essa função leva os vetores dos itens para a esfera unitária com uma coordenada extra, de forma que a
+            distância a uma consulta normalizada decresça com o produto interno.
+        """
+        norms = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+        maxNorm = max(norms.max(), 1e-12)
+
+        return np.hstack([vectors, np.sqrt(np.maximum(maxNorm ** 2 - norms ** 2, 0))[:, np.newaxis]]) / maxNorm
+
+    def _assign(self, points, centroids, blockSize=65536):
+        """ Essa função associa cada ponto ao centróide mais próximo, em blocos de pontos.
+        """
+        centroidNorms = np.einsum('ij,ij->i', centroids, centroids)
+
+        return np.concatenate([np.argmax(2 * points[start:start + blockSize] @ centroids.T - centroidNorms, axis=1)
+                               for start in range(0, len(points), blockSize)])
+
+    def _kMeans(self, points, nLists, scatterAdd):
+        """ Essa função agrupa os pontos em nLists grupos pelo k-means. As somas de cada grupo são feitas por
+            scatterAdd, o `CollaborativeRecommender._scatterAdd`, e grupos vazios são reiniciados em pontos aleatórios.
+        """
+        random = np.random.RandomState(self.seed)
+        centroids = points[random.choice(len(points), nLists, replace=False)]
+
+        for iteration in range(self.nIterations):
+            labels = self._assign(points, centroids)
+            counts = np.bincount(labels, minlength=nLists)
+
+            sums = np.zeros_like(centroids)
+            scatterAdd(sums, labels, points)
+
+            empty = counts == 0
+            centroids = np.where(empty[:, np.newaxis], points[random.choice(len(points), nLists)], sums / np.maximum(counts, 1)[:, np.newaxis])
+
+        return centroids, self._assign(points, centroids)
+
+    def build(self, recommender):
+        """ Essa função constrói o índice a partir dos fatores e dos bias dos itens de um recomendador treinado.
+            Os vetores dos itens são guardados na ordem das listas, para que cada lista seja lida de forma contígua.
+
+        Attributes:
+        -----------
+            centroids_ (numpy array): Centróides das listas, no espaço transformado
+
+            listItems_ (numpy array): Índices dos itens, ordenados por lista
+
+            listStarts_ (numpy array): Posição em listItems_ onde começa cada lista, com uma posição a mais para o
+            fim da última lista
+
+        Returns:
+        -----------
+            self (ItemFactorIndex): O próprio índice construído
+
+        """
+        vectors = self._itemVectors(recommender)
+        nLists = min(self.nLists or max(1, int(np.sqrt(len(vectors)))), len(vectors))
+
+        self.centroids_, labels = self._kMeans(self._transform(vectors), nLists, recommender._scatterAdd)
+
+        self.listItems_ = np.argsort(labels, kind='stable')
+        self.listStarts_ = np.searchsorted(labels[self.listItems_], np.arange(nLists + 1))
+
+        self._attach(recommender)
+
+        return self
+
+    def _attach(self, recommender):
+        """ Essa função associa o índice ao recomendador, lendo os vetores e os ids dos itens na ordem das listas, e
+            calcula as normas dos centróides usadas em todas as consultas.
+        """
+        self.centroidNorms_ = np.einsum('ij,ij->i', self.centroids_, self.centroids_)
+        self.listVectors_ = self._itemVectors(recommender)[self.listItems_]
+        self.itemIds_ = recommender._mappingIds(recommender.itemMapping_)
+        self.recommender_ = recommender
+
+    def _searchBlock(self, users, k, nProbe, ratedItems=None, userStarts=None):
+        """ Essa função seleciona os k itens de maior nota de um bloco de usuários. O bloco é comparado com todos os
+            centróides em um único produto de matrizes, os usuários são agrupados pelas listas que sondam e cada lista
+            é pontuada uma única vez para todos os seus usuários. As notas de cada usuário ficam lado a lado em uma
+            matriz completada com -inf, de onde os k maiores são selecionados.
+
+        Returns:
+        -----------
+            topItems (numpy array): Índices dos itens selecionados de cada usuário, em ordem decrescente de nota
+
+            topScores (numpy array): Notas preditas dos itens selecionados, -inf quando não há k candidatos
+
+        """
+        recommender = self.recommender_
+        queries = np.hstack([recommender.pu_[users], np.ones((len(users), 1), dtype=recommender.pu_.dtype)])
+        normalized = queries / np.linalg.norm(queries, axis=1)[:, np.newaxis]
+
+        centroidScores = 2 * normalized @ self.centroids_[:, :-1].T - self.centroidNorms_
+        nProbe = min(nProbe, len(self.centroidNorms_))
+        probes = np.argpartition(-centroidScores, nProbe - 1, axis=1)[:, :nProbe]
+
+        sizes = self.listStarts_[probes + 1] - self.listStarts_[probes]
+        offsets = np.cumsum(sizes, axis=1) - sizes
+
+        scores = np.full((len(users), sizes.sum(axis=1).max()), -np.inf)
+        items = np.zeros(scores.shape, dtype=np.int64)
+
+        pairRows, pairProbes = np.nonzero(np.ones(probes.shape, dtype=bool))
+        pairLists = probes[pairRows, pairProbes]
+        order = np.argsort(pairLists, kind='stable')
+        groupBounds = np.r_[0, np.flatnonzero(np.diff(pairLists[order])) + 1, len(order)]
+
+        for group in range(len(groupBounds) - 1):
+            pairs = order[groupBounds[group]:groupBounds[group + 1]]
+            rows = pairRows[pairs]
+            listId = pairLists[pairs[0]]
+            start, end = self.listStarts_[listId], self.listStarts_[listId + 1]
+
+            columns = offsets[rows, pairProbes[pairs]][:, np.newaxis] + np.arange(end - start)
+            scores[rows[:, np.newaxis], columns] = queries[rows] @ self.listVectors_[start:end].T
+            items[rows[:, np.newaxis], columns] = self.listItems_[start:end]
+
+        scores += (recommender.globalMean_ + recommender.bu_[users])[:, np.newaxis]
+
+        if ratedItems is not None:
+            counts = userStarts[users + 1] - userStarts[users]
+            positions = np.repeat(userStarts[users] - np.r_[0, np.cumsum(counts)[:-1]], counts) + np.arange(counts.sum())
+            nItems = len(self.listItems_)
+
+            ratedKeys = np.repeat(np.arange(len(users)), counts) * nItems + ratedItems[positions]
+            candidateKeys = np.arange(len(users))[:, np.newaxis] * nItems + items
+            scores[np.isin(candidateKeys, ratedKeys)] = -np.inf
+
+        topPositions, topScores = recommender._selectTopK(scores, k)
+
+        return np.take_along_axis(items, topPositions, axis=1), topScores
+
+    def recommendTopK(self, k=10, users=None, excludeRated=True, nProbe=None, userBlockSize=1024, ratings=None):
+        """ Essa função retorna os k itens de maior nota predita de cada usuário, como
+            `CollaborativeRecommender.recommendTopK`, pontuando apenas os itens das listas sondadas.
+
+        Parameters:
+        -----------
+            k (int): Número de itens recomendados por usuário
+
+            users (list): Ids dos usuários a recomendar. Se não definido, todos os usuários do modelo. Ids
+            desconhecidos são ignorados
+
+            excludeRated (bool): Se verdadeiro os itens já avaliados pelo usuário não são recomendados. Sem
+            ratings requer o modelo treinado nesta instância
+
+            nProbe (int): Número de listas sondadas. Se não definido, o valor do índice
+
+            userBlockSize (int): Número de usuários pontuados em cada bloco
+
+            ratings (pandas dataframe): Notas conhecidas excluídas das recomendações, como em
+            `CollaborativeRecommender.iterTopK`
+
+        Returns:
+        -----------
+            recommendations (pandas dataframe): Itens recomendados com as colunas UserId, ItemId e Predictions,
+            agrupados por usuário e ordenados por nota predita
+
+        """
+        recommender = self.recommender_
+        nProbe = nProbe or self.nProbe
+        userIds = recommender._mappingIds(recommender.userMapping_)
+
+        if users is None:
+            userIndexes = np.arange(len(userIds))
+        else:
+            userIndexes = recommender._mapIds(users, recommender.userMapping_)
+            userIndexes = userIndexes[userIndexes > -1]
+
+        ratedItems, userStarts = None, None
+
+        if excludeRated:
+            ratedItems, userStarts = recommender._groupRatedItems(ratings)
+
+        blocks = []
+
+        for start in range(0, len(userIndexes), userBlockSize):
+            block = userIndexes[start:start + userBlockSize]
+            topItems, topScores = self._searchBlock(block, k, nProbe, ratedItems, userStarts)
+            selected = np.isfinite(topScores)
+
+            blocks.append(pd.DataFrame({
+                'UserId': np.repeat(userIds[block], topItems.shape[1])[selected.ravel()],
+                'ItemId': self.itemIds_[topItems[selected]],
+                'Predictions': np.clip(topScores[selected], recommender.minRating, recommender.maxRating),
+            }))
+
+        if not blocks:
+            return pd.DataFrame(columns=['UserId', 'ItemId', 'Predictions'])
+
+        return pd.concat(blocks, ignore_index=True)
+
+    def recallReport(self, k=10, nProbes=(1, 2, 4, 8, 16), sampleSize=1000, excludeRated=True):
+        """ Essa função compara as recomendações do índice com as exatas para uma amostra fixa de usuários, para
+            cada valor de nProbe, e mede a revocação e o tempo das duas buscas.
+
+        Returns:
+        -----------
+            report (pandas dataframe): Uma linha por nProbe com a revocação média, o tempo exato, o tempo
+            aproximado e a fração média do catálogo pontuada
+
+        """
+        recommender = self.recommender_
+        userIds = recommender._mappingIds(recommender.userMapping_)
+        users = np.sort(np.random.RandomState(13).choice(len(userIds), min(sampleSize, len(userIds)), replace=False))
+        users = userIds[users].tolist()
+
+        start = time.perf_counter()
+        exact = recommender.recommendTopK(k, users=users, excludeRated=excludeRated)
+        exactSeconds = time.perf_counter() - start
+        exactPairs = set(zip(exact['UserId'], exact['ItemId']))
+
+        listSizes = np.diff(self.listStarts_)
+        rows = []
+
+        for nProbe in nProbes:
+            start = time.perf_counter()
+            approximate = self.recommendTopK(k, users=users, excludeRated=excludeRated, nProbe=nProbe)
+            approximateSeconds = time.perf_counter() - start
+
+            hits = len(exactPairs.intersection(zip(approximate['UserId'], approximate['ItemId'])))
+            largestLists = np.sort(listSizes)[::-1][:nProbe].sum()
+
+            rows.append({
+                'nProbe': nProbe,
+                'recall': hits / max(len(exactPairs), 1),
+                'exactSeconds': exactSeconds,
+                'approximateSeconds': approximateSeconds,
+                'maxScannedFraction': min(largestLists / len(self.listItems_), 1.0),
+            })
+
+        return pd.DataFrame(rows)
+
+    def save(self, path):
+        """ Essa função salva o índice no diretório do modelo colaborativo, ao lado dos arquivos de `saveModel`.
+            Apenas a estrutura das listas é gravada, os vetores são lidos do modelo na carga.
+        """
+        os.makedirs(path, exist_ok=True)
+
+        for name in ['centroids', 'listItems', 'listStarts']:
+            np.save(os.path.join(path, 'index' + name[0].upper() + name[1:] + '.npy'), getattr(self, name + '_'), allow_pickle=False)
+
+        with open(os.path.join(path, 'index.json'), 'w') as f:
+            json.dump({'nLists': len(self.centroids_), 'nProbe': self.nProbe, 'nIterations': self.nIterations, 'seed': self.seed}, f, indent=4)
+
+    @classmethod
+    def load(cls, path, recommender):
+        """ Essa função carrega um índice salvo por `save` e o associa ao recomendador do mesmo modelo.
+
+        Parameters:
+        -----------
+            path (str): Diretório onde o modelo e o índice foram salvos
+
+            recommender (CollaborativeRecommender): Recomendador carregado do mesmo diretório
+
+        Returns:
+        -----------
+            index (ItemFactorIndex): Índice pronto para o `recommendTopK`
+
+        """
+        with open(os.path.join(path, 'index.json'), 'r') as f:
+            index = cls(**json.load(f))
+
+        load = lambda name: np.load(os.path.join(path, name + '.npy'), allow_pickle=False)
+
+        index.centroids_ = load('indexCentroids')
+        index.listItems_ = load('indexListItems')
+        index.listStarts_ = load('indexListStarts')
+        index._attach(recommender)
+
+        return index
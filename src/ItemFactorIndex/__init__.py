@@ -0,0 +1 @@
+from .ItemFactorIndex import ItemFactorIndex
\ No newline at end of file
@@ -0,0 +1,91 @@
+import gzip
+import sys
+
+class OutputWriter:
+    def __init__(self, destination='-', columns=None, chunkSize=100000, compressLevel=6):
+        """ Essa classe implementa a saída das recomendações em formato .csv. O destino pode ser a saída padrão ('-'),
+            um arquivo .csv ou um arquivo .csv.gz, comprimido com gzip. Os dataframes recebidos são convertidos para
+            texto em blocos de chunkSize linhas, e cada bloco é gravado de uma só vez, ao invés de uma escrita por
+            linha.
+
+        Attributes:
+        -----------
+            destination (str): '-' para a saída padrão, ou o caminho do arquivo. Caminhos terminados em .gz são
+            comprimidos
+
+            columns (list): Colunas gravadas. Se não definido, todas as colunas do primeiro bloco
+
+            chunkSize (int): Número de linhas convertidas e gravadas de cada vez
+
+            compressLevel (int): Nível de compressão do gzip
+
+        """
+        self.destination = destination
+        self.columns = columns
+        self.chunkSize = chunkSize
+        self.compressLevel = compressLevel
+        self.file_ = None
+
+    def open(self):
+        """ Essa função abre o destino da saída.
+        """
+        if self.destination == '-':
+            sys.stdout.flush()
+            self.file_ = sys.stdout.buffer
+        elif self.destination.endswith('.gz'):
+            self.file_ = gzip.open(self.destination, 'wb', compresslevel=self.compressLevel)
+        else:
+            self.file_ = open(self.destination, 'wb')
+
+        self.headerWritten_ = False
+        return self
+
+    def _writeHeader(self):
+        """ Essa função grava o cabeçalho com os nomes das colunas, uma única vez.
+        """
+        if not self.headerWritten_ and self.columns is not None:
+            self.file_.write((','.join(self.columns) + '\n').encode())
+            self.headerWritten_ = True
+
+    def write(self, dataFrame):
+        """ Essa função grava as linhas de um dataframe no destino, em blocos de chunkSize linhas.
+        """
+        if self.file_ is None:
+            self.open()
+
+        if self.columns is None:
+            self.columns = dataFrame.columns.tolist()
+
+        self._writeHeader()
+
+        for start in range(0, len(dataFrame), self.chunkSize):
+            chunk = dataFrame.iloc[start:start + self.chunkSize]
+            self.file_.write(chunk.to_csv(columns=self.columns, header=False, index=False).encode())
+
+    def writeChunks(self, dataFrames):
+        """ Essa função grava, à medida que são gerados, os dataframes de um iterador, como o `iterTopK` do
+            recomendador colaborativo.
+        """
+        for dataFrame in dataFrames:
+            self.write(dataFrame)
+
+    def close(self):
+        """ Essa função grava o que estiver pendente e fecha o destino. A saída padrão não é fechada.
+        """
+        if self.file_ is None:
+            return
+
+        self._writeHeader()
+
+        if self.destination == '-':
+            self.file_.flush()
+        else:
+            self.file_.close()
+
+        self.file_ = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
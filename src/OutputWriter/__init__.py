@@ -0,0 +1 @@
+from .OutputWriter import OutputWriter
\ No newline at end of file
@@ -0,0 +1,116 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from ..CollaborativeRecommender.CollaborativeRecommender import CollaborativeRecommender
+from ..ContentRecommender.ContentRecommender import ContentRecommender
+from ..DataLoader.DataLoader import DataLoader
+from ..Instrumentation.Instrumentation import Instrumentation
+from ..SharedArrays.SharedArrays import SharedArrays
+
+class ParallelPipeline:
+    def __init__(self, parallel=True, loadModel=None, saveModel=None, contentCache=None, instrumentation=None):
+        """ Essa classe orquestra os ramos colaborativo e baseado em conteúdo, que compartilham apenas as entradas, que
+            são somente lidas. No modo paralelo cada ramo roda em um processo próprio, e as notas e os targets são
+            passados pela memória compartilhada, ao invés de dataframes serializados.
+
+        Attributes:
+        -----------
+            parallel (bool): Se verdadeiro os dois ramos rodam ao mesmo tempo em processos separados, senão um após o
+            outro no processo atual
+
+            loadModel (str): Diretório de um modelo colaborativo salvo, usado ao invés de treinar um novo
+
+            saveModel (str): Diretório onde o modelo colaborativo treinado é salvo
+
+            contentCache (str): Diretório do cache dos dados de conteúdo corrigidos
+
+            instrumentation (Instrumentation): Instrumentação passada aos dois recomendadores. No modo paralelo os
+            registros de cada processo são reunidos nela ao fim
+
+        """
+        self.parallel = parallel
+        self.loadModel = loadModel
+        self.saveModel = saveModel
+        self.contentCache = contentCache
+        self.instrumentation = instrumentation or Instrumentation.disabled()
+
+    def _runCollaborative(self, ratings, targets):
+        """ Essa função executa o ramo colaborativo: carrega o modelo salvo ou treina um novo com a separação padrão
+            entre treino e validação, salva o modelo se pedido e retorna as predições dos targets. Um modelo carregado
+            não é salvo de volta no próprio diretório, que já o contém.
+        """
+        if self.loadModel:
+            recommender = CollaborativeRecommender.loadModel(self.loadModel, instrumentation=self.instrumentation)
+        else:
+            training, validation = DataLoader().splitTrainingValidation(ratings)
+            recommender = CollaborativeRecommender(instrumentation=self.instrumentation)
+            recommender.train(training, validation)
+
+        if self.saveModel and not self._savesLoadedModel():
+            recommender.saveModel(self.saveModel)
+
+        return recommender.predict(targets, saveToFile=False, printOnConsole=False, getPredictions=True)
+
+    def _savesLoadedModel(self):
+        """ Essa função indica se o diretório onde o modelo seria salvo é o mesmo de onde ele foi carregado.
+        """
+        return bool(self.loadModel) and os.path.realpath(self.loadModel) == os.path.realpath(self.saveModel)
+
+    def _runContent(self, ratings, content, targets):
+        """ Essa função executa o ramo baseado em conteúdo e retorna as similaridades dos targets.
+        """
+        recommender = ContentRecommender(cacheDir=self.contentCache, instrumentation=self.instrumentation)
+
+        return recommender.getPredictions(ratings, content, targets)
+
+    def _runSharedCollaborative(self, descriptor):
+        """ Essa função é executada no processo do ramo colaborativo, com as notas e os targets lidos da memória
+            compartilhada. Ela retorna as predições e as métricas registradas no processo.
+        """
+        shared = SharedArrays.attach(descriptor)
+
+        try:
+            return self._runCollaborative(shared.toFrame('ratings'), shared.toFrame('targets')), self.instrumentation.metrics()
+        finally:
+            shared.close()
+
+    def _runSharedContent(self, descriptor, content):
+        """ Essa função é executada no processo do ramo baseado em conteúdo, com as notas e os targets lidos da memória
+            compartilhada. Ela retorna as similaridades e as métricas registradas no processo.
+        """
+        shared = SharedArrays.attach(descriptor)
+
+        try:
+            return self._runContent(shared.toFrame('ratings'), content, shared.toFrame('targets')), self.instrumentation.metrics()
+        finally:
+            shared.close()
+
+    def run(self, ratings, content, targets):
+        """ Essa função executa os dois ramos e retorna as suas predições. O conteúdo pode ser um dataframe ou o
+            caminho do arquivo .jsonl, que no modo paralelo evita serializar o dataframe de conteúdo.
+
+        Returns:
+        -----------
+            cfPredictions (pandas dataframe): Predições do recomendador colaborativo
+
+            cbPredictions (pandas dataframe): Similaridades do recomendador baseado em conteúdo
+
+        """
+        if not self.parallel:
+            return self._runCollaborative(ratings, targets), self._runContent(ratings, content, targets)
+
+        shared = SharedArrays.shareFrames({'ratings': ratings, 'targets': targets})
+
+        try:
+            with ProcessPoolExecutor(max_workers=2) as executor:
+                cfFuture = executor.submit(self._runSharedCollaborative, shared.descriptor())
+                cbFuture = executor.submit(self._runSharedContent, shared.descriptor(), content)
+
+                (cfPredictions, cfMetrics), (cbPredictions, cbMetrics) = cfFuture.result(), cbFuture.result()
+        finally:
+            shared.close()
+
+        self.instrumentation.merge(cfMetrics)
+        self.instrumentation.merge(cbMetrics)
+
+        return cfPredictions, cbPredictions
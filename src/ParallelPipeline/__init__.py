@@ -0,0 +1 @@
+from .ParallelPipeline import ParallelPipeline
\ No newline at end of file
@@ -0,0 +1,24 @@
+import numpy as np
+
+class RatingScale:
+    """ Essa classe converte notas na escala usada pelos recomendadores baseado em conteúdo e híbrido. Se a nota é 10 a
+        escala é 3, indicando uma recomendação perfeita. Se é maior que 7 a escala é 2, se é maior que 5 a escala é 1 e
+        nos demais casos a escala é zero, representando uma escolha ruim ou não avaliada.
+    """
+
+    @staticmethod
+    def grade(ratings):
+        """ Essa função substitui as notas pela escala correspondente a cada nota, de uma só vez.
+
+        Parameters:
+        -----------
+            ratings (array): Notas reais ou preditas
+
+        Returns:
+        -----------
+            grades (numpy array): Escala de cada nota
+
+        """
+        ratings = np.asarray(ratings)
+
+        return np.select([ratings == 10, ratings > 7, ratings > 5], [3, 2, 1], default=0)
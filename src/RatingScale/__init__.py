@@ -0,0 +1 @@
+from .RatingScale import RatingScale
\ No newline at end of file
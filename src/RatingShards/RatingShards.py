@@ -0,0 +1,163 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from ..IdMapping.IdMapping import IdMapping
+
+class RatingShards:
+    shardType = np.dtype([('user', np.int32), ('item', np.int32), ('rating', np.float32)])
+
+    def __init__(self, directory):
+        """ Essa classe guarda as notas mapeadas em arquivos binários de tamanho limitado (shards), com registros
+            (usuário, item, nota) em int32, int32 e float32, lidos por mapeamento de memória. Assim o treino
+            colaborativo percorre as notas um shard de cada vez e o pico de memória depende do tamanho do shard e não
+            do número de notas. Os shards são criados por `write` ou `fromJsonLines` e abertos pelo construtor.
+
+        Attributes:
+        -----------
+            directory (str): Diretório dos shards
+
+            metadata_ (dict): Arquivos dos shards de treino e de validação, número de notas, de usuários e de itens
+            e média global das notas de treino
+
+        """
+        self.directory = directory
+
+        with open(os.path.join(directory, 'shards.json'), 'r') as f:
+            self.metadata_ = json.load(f)
+
+    @classmethod
+    def write(cls, chunks, directory, shardSize=1000000, trainingFraction=0.8, seed=8):
+        """ Essa função mapeia os ids e grava as notas em shards, lendo um bloco de cada vez. Cada nota vai para o
+            treino com probabilidade trainingFraction, sorteada bloco a bloco, ou para a validação.
+
+        Parameters:
+        -----------
+            chunks (iterable): Dataframes com as colunas UserId, ItemId e Rating, por exemplo de
+            `DataLoader.iterRatings`
+
+            directory (str): Diretório onde os shards são gravados, criado se não existir
+
+            shardSize (int): Número máximo de notas de cada shard
+
+            trainingFraction (float): Fração das notas usadas no treino
+
+            seed (int): Semente do sorteio entre treino e validação
+
+        Returns:
+        -----------
+            shards (RatingShards): Shards gravados, prontos para o treino
+
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        random = np.random.RandomState(seed)
+        userMapping, itemMapping = IdMapping([]), IdMapping([])
+        writers = {'training': _ShardWriter(directory, 'training', shardSize), 'validation': _ShardWriter(directory, 'validation', shardSize)}
+        ratingSum = 0.0
+
+        for chunk in chunks:
+            users, items = np.asarray(chunk['UserId']), np.asarray(chunk['ItemId'])
+
+            for mapping, ids in [(userMapping, users), (itemMapping, items)]:
+                uniqueIds = pd.unique(ids)
+                mapping.extend(uniqueIds[mapping.lookup(uniqueIds) < 0])
+
+            records = np.empty(len(chunk), dtype=cls.shardType)
+            records['user'] = userMapping.lookup(users)
+            records['item'] = itemMapping.lookup(items)
+            records['rating'] = chunk['Rating'].to_numpy()
+
+            isTraining = random.rand(len(records)) < trainingFraction
+            ratingSum += records['rating'][isTraining].sum(dtype=np.float64)
+
+            writers['training'].append(records[isTraining])
+            writers['validation'].append(records[~isTraining])
+
+        np.save(os.path.join(directory, 'userIds.npy'), userMapping.ids_, allow_pickle=False)
+        np.save(os.path.join(directory, 'itemIds.npy'), itemMapping.ids_, allow_pickle=False)
+
+        metadata = {name: writer.close() for name, writer in writers.items()}
+        metadata.update({
+            'nUsers': len(userMapping),
+            'nItems': len(itemMapping),
+            'globalMean': ratingSum / max(metadata['training']['nRatings'], 1),
+        })
+
+        with open(os.path.join(directory, 'shards.json'), 'w') as f:
+            json.dump(metadata, f, indent=4)
+
+        return cls(directory)
+
+    @classmethod
+    def fromJsonLines(cls, path, directory, dataLoader, **kwargs):
+        """ Essa função grava em shards o arquivo .jsonl de notas, lido em blocos pelo DataLoader. Os demais
+            parâmetros são os de `write`.
+        """
+        return cls.write(dataLoader.iterRatings(path), directory, **kwargs)
+
+    def ids(self, name):
+        """ Essa função lê os ids de usuários (userIds) ou de itens (itemIds), na ordem dos seus índices.
+        """
+        return np.load(os.path.join(self.directory, name + '.npy'), allow_pickle=False)
+
+    def iterShards(self, kind='training', order=None):
+        """ Essa função entrega os shards de treino ou de validação mapeados em memória, na ordem order quando
+            definida.
+        """
+        files = self.metadata_[kind]['files']
+
+        for shard in (range(len(files)) if order is None else order):
+            yield np.load(os.path.join(self.directory, files[shard]), mmap_mode='r')
+
+    def nShards(self, kind='training'):
+        """ Essa função retorna o número de shards de treino ou de validação.
+        """
+        return len(self.metadata_[kind]['files'])
+
+    def __len__(self):
+        return self.metadata_['training']['nRatings']
+
+class _ShardWriter:
+    def __init__(self, directory, kind, shardSize):
+        """ Essa classe acumula registros e grava um shard sempre que shardSize registros são reunidos.
+        """
+        self.directory = directory
+        self.kind = kind
+        self.shardSize = shardSize
+        self.buffer_ = []
+        self.buffered_ = 0
+        self.files_ = []
+        self.nRatings_ = 0
+
+    def _flush(self, size):
+        """ Essa função grava os primeiros size registros acumulados em um novo shard.
+        """
+        records = np.concatenate(self.buffer_)
+        name = '%s-%05d.npy' % (self.kind, len(self.files_))
+
+        np.save(os.path.join(self.directory, name), records[:size], allow_pickle=False)
+
+        self.files_.append(name)
+        self.buffer_ = [records[size:]]
+        self.buffered_ = len(records) - size
+
+    def append(self, records):
+        """ Essa função acumula registros, gravando os shards que ficarem completos.
+        """
+        self.buffer_.append(records)
+        self.buffered_ += len(records)
+        self.nRatings_ += len(records)
+
+        while self.buffered_ >= self.shardSize:
+            self._flush(self.shardSize)
+
+    def close(self):
+        """ Essa função grava os registros restantes e retorna a descrição dos shards gravados.
+        """
+        if self.buffered_:
+            self._flush(self.buffered_)
+
+        return {'files': self.files_, 'nRatings': self.nRatings_}
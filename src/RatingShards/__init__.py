@@ -0,0 +1 @@
+from .RatingShards import RatingShards
\ No newline at end of file
@@ -0,0 +1,298 @@
+import asyncio
+import json
+from collections import OrderedDict
+from itertools import islice
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from ..IdMapping.IdMapping import IdMapping
+
+class RecommendationServer:
+    def __init__(self, collaborative, content, ratings, cacheSize=10000, defaultK=10):
+        """ Essa classe mantém os recomendadores colaborativo e baseado em conteúdo carregados em memória e responde
+            consultas de um usuário por HTTP, em um laço do asyncio. Os resultados de cada usuário ficam em um cache
+            LRU, esvaziado sempre que o modelo é atualizado com novas notas.
+
+            Rotas:
+                GET /recommend?user=<id>&k=<k>: os k itens de maior nota predita ainda não avaliados pelo usuário
+                GET /score?user=<id>&item=<id>: a nota predita e a similaridade de conteúdo de um par
+                POST /ratings: incorpora ao modelo uma lista JSON de notas com UserId, ItemId e Rating
+                GET /health: estado do servidor e versão do modelo
+
+        Attributes:
+        -----------
+            collaborative (CollaborativeRecommender): Recomendador colaborativo treinado ou carregado
+
+            content (ContentRecommender): Recomendador baseado em conteúdo com os perfis calculados por `fitProfiles`
+
+            ratings (pandas dataframe): Notas conhecidas, usadas para não recomendar itens já avaliados
+
+            cacheSize (int): Número máximo de respostas mantidas no cache
+
+            defaultK (int): Número de itens recomendados quando a consulta não define k
+
+        """
+        self.collaborative = collaborative
+        self.content = content
+        self.cacheSize = cacheSize
+        self.defaultK = defaultK
+        self.version_ = 0
+        self.cache_ = OrderedDict()
+        self.itemIds_ = self.collaborative._mappingIds(self.collaborative.itemMapping_)
+
+        self.ratedItems_, self.userStarts_ = self.collaborative._groupRatedItems(ratings)
+
+    def _mapPairs(self, ratings):
+        """ Essa função mapeia os pares (usuário, item) das notas para os índices do modelo colaborativo, descartando
+            os ids desconhecidos.
+        """
+        users = self.collaborative._mapIds(ratings['UserId'], self.collaborative.userMapping_)
+        items = self.collaborative._mapIds(ratings['ItemId'], self.collaborative.itemMapping_)
+        known = (users > -1) & (items > -1)
+
+        return users[known], items[known]
+
+    def _mergeRatedItems(self, users, items):
+        """ Essa função insere novos pares (usuário, item) no CSR dos itens avaliados sem reordenar o histórico: os
+            pares ordenados por usuário são inseridos no fim das linhas dos seus usuários, e os usuários novos recebem
+            linhas ao final.
+        """
+        order = np.argsort(users, kind='stable')
+        users, items = users[order], items[order]
+
+        nUsers = len(self.collaborative.bu_)
+        starts = np.r_[self.userStarts_, np.full(nUsers + 1 - len(self.userStarts_), self.userStarts_[-1])]
+        counts = np.bincount(users, minlength=nUsers)
+
+        self.ratedItems_ = np.insert(self.ratedItems_, starts[users + 1], items)
+        self.userStarts_ = starts + np.r_[0, np.cumsum(counts)]
+
+    def _extendItemIds(self):
+        """ Essa função acrescenta aos ids dos itens por índice apenas os itens novos do modelo colaborativo, que o
+            mapeamento sempre coloca no final. No modo compacto o array do IdMapping é lido direto.
+        """
+        mapping = self.collaborative.itemMapping_
+        nKnown = len(self.itemIds_)
+
+        if len(mapping) == nKnown:
+            return
+
+        if isinstance(mapping, IdMapping):
+            self.itemIds_ = mapping.ids_
+        else:
+            self.itemIds_ = np.concatenate([self.itemIds_, np.array(list(islice(mapping, nKnown, None)))])
+
+    def _cached(self, key, compute):
+        """ Essa função retorna a resposta do cache LRU, ou a calcula e a guarda, descartando a menos usada quando o
+            cache está cheio.
+        """
+        if key in self.cache_:
+            self.cache_.move_to_end(key)
+            return self.cache_[key]
+
+        value = compute()
+        self.cache_[key] = value
+
+        if len(self.cache_) > self.cacheSize:
+            self.cache_.popitem(last=False)
+
+        return value
+
+    def recommend(self, userId, k=None):
+        """ Essa função retorna os k itens de maior nota predita para o usuário, sem os itens que ele já avaliou.
+            Usuários desconhecidos recebem uma lista vazia. k é limitado ao tamanho do catálogo.
+        """
+        k = self.defaultK if k is None else k
+
+        if k < 1:
+            raise ValueError('k deve ser maior que zero: ' + str(k))
+
+        k = min(k, len(self.itemIds_))
+
+        return self._cached(('recommend', userId, k), lambda: self._recommend(userId, k))
+
+    def _recommend(self, userId, k):
+        """ Essa função pontua todo o catálogo para um único usuário e seleciona os k maiores.
+        """
+        cf = self.collaborative
+        user = cf.userMapping_.get(userId)
+
+        if user is None:
+            return {'user': userId, 'items': []}
+
+        scores = cf.qi_ @ cf.pu_[user]
+        scores += cf.bi_
+        scores += cf.globalMean_ + cf.bu_[user]
+        scores[self.ratedItems_[self.userStarts_[user]:self.userStarts_[user + 1]]] = -np.inf
+
+        topItems, topScores = cf._selectTopK(scores[np.newaxis, :], k)
+        selected = np.isfinite(topScores[0])
+
+        return {
+            'user': userId,
+            'items': [{'item': item, 'prediction': prediction} for item, prediction in
+                      zip(self.itemIds_[topItems[0][selected]].tolist(),
+                          np.clip(topScores[0][selected], cf.minRating, cf.maxRating).tolist())],
+        }
+
+    def score(self, userId, itemId):
+        """ Essa função retorna a nota predita pelo modelo colaborativo e a similaridade de conteúdo de um par
+            (usuário, item). A similaridade é None quando o usuário não tem perfil ou o item não tem gêneros.
+        """
+        return self._cached(('score', userId, itemId), lambda: self._score(userId, itemId))
+
+    def _score(self, userId, itemId):
+        """ Essa função calcula a nota predita e a similaridade de um par, sem passar pelo cache.
+        """
+        cf = self.collaborative
+        user = np.array([cf.userMapping_.get(userId, -1)])
+        item = np.array([cf.itemMapping_.get(itemId, -1)])
+        prediction = cf._predictRatings(user, item, cf.bu_, cf.bi_, cf.pu_, cf.qi_)[0]
+
+        return {
+            'user': userId,
+            'item': itemId,
+            'prediction': float(np.clip(prediction, cf.minRating, cf.maxRating)),
+            'similarity': self._similarity(userId, itemId),
+        }
+
+    def _similarity(self, userId, itemId):
+        """ Essa função calcula o cosseno entre o perfil do usuário e o vetor de gêneros do item, como em
+            `ContentRecommender._scoreTargets`.
+        """
+        cb = self.content
+        user = cb.userIndex_.get_loc(userId) if userId in cb.userIndex_ else -1
+        item = cb.itemIndex_.get_loc(itemId) if itemId in cb.itemIndex_ else -1
+
+        if user < 0 or item < 0:
+            return None
+
+        genres = cb.genreIndices_[cb.genreIndptr_[item]:cb.genreIndptr_[item + 1]]
+        denominator = cb.userNorms_[user] * cb.itemNorms_[item]
+
+        return float(cb.userProfiles_[user, genres].sum() / denominator) if denominator > 0 else None
+
+    def _parseRatings(self, body):
+        """ Essa função lê as notas de um POST /ratings e as valida antes de qualquer atualização do modelo. Notas
+            ausentes, não numéricas ou fora do intervalo do modelo colaborativo são rejeitadas.
+
+        Returns:
+        -----------
+            newRatings (pandas dataframe): Notas com as colunas UserId, ItemId e Rating
+
+        """
+        records = json.loads(body)
+
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise ValueError('o corpo deve ser uma lista JSON de notas')
+
+        newRatings = pd.DataFrame(records, columns=['UserId', 'ItemId', 'Rating'])
+
+        if newRatings[['UserId', 'ItemId']].isna().values.any():
+            raise ValueError('toda nota deve ter UserId e ItemId')
+
+        ratings = pd.to_numeric(newRatings['Rating'], errors='coerce')
+        cf = self.collaborative
+        invalid = ratings.isna() | (ratings < cf.minRating) | (ratings > cf.maxRating)
+
+        if invalid.any():
+            raise ValueError('Rating deve ser um número entre %s e %s: %s'
+                             % (cf.minRating, cf.maxRating, newRatings['Rating'][invalid].tolist()[:10]))
+
+        newRatings['Rating'] = ratings
+
+        return newRatings
+
+    def update(self, newRatings):
+        """ Essa função incorpora novas notas ao modelo colaborativo e aos perfis de conteúdo, que são atualizados
+            apenas nos usuários e itens afetados, marca os pares como avaliados e esvazia o cache.
+        """
+        self.collaborative.updateModel(newRatings)
+        self.content.updateProfiles(newRatings)
+
+        self._extendItemIds()
+        self._mergeRatedItems(*self._mapPairs(newRatings))
+        self.cache_.clear()
+        self.version_ += 1
+
+        return {'updated': len(newRatings), 'version': self.version_}
+
+    def _route(self, method, target, body):
+        """ Essa função despacha uma requisição para a rota correspondente e retorna o status e a resposta.
+        """
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        if method == 'GET' and url.path == '/recommend' and 'user' in query:
+            return 200, self.recommend(query['user'], int(query['k']) if 'k' in query else None)
+
+        if method == 'GET' and url.path == '/score' and 'user' in query and 'item' in query:
+            return 200, self.score(query['user'], query['item'])
+
+        if method == 'POST' and url.path == '/ratings':
+            return 200, self.update(self._parseRatings(body))
+
+        if method == 'GET' and url.path == '/health':
+            return 200, {'status': 'ok', 'version': self.version_, 'cached': len(self.cache_)}
+
+        return 404, {'error': 'rota desconhecida: ' + method + ' ' + url.path}
+
+    async def _handleConnection(self, reader, writer):
+        """ Essa função atende as requisições HTTP/1.1 de uma conexão, que é mantida aberta entre as requisições até
+            que o cliente a feche ou envie Connection: close.
+        """
+        try:
+            while True:
+                requestLine = await reader.readline()
+
+                if not requestLine:
+                    break
+
+                method, target, _ = requestLine.decode('latin-1').split(' ', 2)
+                headers = {}
+
+                while True:
+                    line = await reader.readline()
+
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                try:
+                    status, response = self._route(method, target, body)
+                except (ValueError, KeyError) as error:
+                    status, response = 400, {'error': str(error)}
+
+                payload = json.dumps(response).encode()
+                keepAlive = headers.get('connection', '').lower() != 'close'
+
+                writer.write(b'HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: %s\r\n\r\n'
+                             % (status, b'OK' if status == 200 else b'Error', len(payload), b'keep-alive' if keepAlive else b'close'))
+                writer.write(payload)
+                await writer.drain()
+
+                if not keepAlive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        """ Essa função inicia o servidor e atende as conexões até ser cancelada.
+        """
+        server = await asyncio.start_server(self._handleConnection, host, port)
+
+        async with server:
+            await server.serve_forever()
+
+    def run(self, host='127.0.0.1', port=8080):
+        """ Essa função executa o servidor no laço do asyncio até ser interrompida.
+        """
+        asyncio.run(self.serve(host, port))
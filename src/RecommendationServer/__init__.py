@@ -0,0 +1 @@
+from .RecommendationServer import RecommendationServer
\ No newline at end of file
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+from multiprocessing import shared_memory
+
+class SharedArrays:
+    def __init__(self):
+        """ Essa classe guarda um conjunto de arrays do NumPy em memória compartilhada, para que processos diferentes
+            leiam e escrevam os mesmos dados sem copiá-los. O processo que cria os arrays os compartilha por meio do
+            `descriptor`, que é pequeno e pode ser enviado aos outros processos, onde o `attach` os mapeia.
+        """
+        self.blocks_ = {}
+        self.arrays_ = {}
+        self.owner_ = False
+
+    @classmethod
+    def create(cls, arrays):
+        """ Essa função copia os arrays para novos blocos de memória compartilhada.
+
+        Parameters:
+        -----------
+            arrays (dict): Arrays a serem compartilhados, por nome
+
+        Returns:
+        -----------
+            shared (SharedArrays): Arrays compartilhados, de propriedade deste processo
+
+        """
+        shared = cls()
+        shared.owner_ = True
+
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+
+            shared.blocks_[name] = block
+            shared.arrays_[name] = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            shared.arrays_[name][...] = array
+
+        return shared
+
+    @classmethod
+    def attach(cls, descriptor):
+        """ Essa função mapeia os arrays compartilhados por outro processo a partir do seu descriptor.
+        """
+        shared = cls()
+
+        for name, (blockName, shape, dtype) in descriptor.items():
+            block = shared_memory.SharedMemory(name=blockName)
+
+            shared.blocks_[name] = block
+            shared.arrays_[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+        return shared
+
+    @classmethod
+    def shareFrames(cls, dataFrames):
+        """ Essa função compartilha as colunas de um conjunto de dataframes. Colunas categóricas são guardadas como os
+            seus códigos e as suas categorias, e as demais colunas precisam ter tipo numérico ou de texto de tamanho
+            fixo.
+
+        Parameters:
+        -----------
+            dataFrames (dict): Dataframes a serem compartilhados, por nome
+
+        Returns:
+        -----------
+            shared (SharedArrays): Colunas compartilhadas, de propriedade deste processo
+
+        """
+        arrays = {}
+
+        for frameName, dataFrame in dataFrames.items():
+            for column in dataFrame.columns:
+                name = frameName + '.' + column
+                values = dataFrame[column]
+
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    arrays[name + ':codes'] = values.cat.codes.to_numpy()
+                    arrays[name + ':categories'] = np.array(values.cat.categories.tolist())
+                else:
+                    arrays[name] = values.to_numpy()
+
+        return cls.create(arrays)
+
+    def toFrame(self, frameName):
+        """ Essa função monta um dataframe compartilhado por `shareFrames` a partir do seu nome.
+        """
+        prefix = frameName + '.'
+        columns = {}
+
+        for name, values in self.arrays_.items():
+            if not name.startswith(prefix) or name.endswith(':categories'):
+                continue
+
+            column = name[len(prefix):]
+
+            if column.endswith(':codes'):
+                column = column[:-len(':codes')]
+                columns[column] = pd.Categorical.from_codes(values, categories=self.arrays_[name[:-len(':codes')] + ':categories'])
+            else:
+                columns[column] = values
+
+        return pd.DataFrame(columns)
+
+    def descriptor(self):
+        """ Essa função retorna o descriptor dos arrays, com o nome do bloco, o formato e o tipo de cada um. Tipos
+            estruturados são descritos pelos seus campos.
+        """
+        return {name: (self.blocks_[name].name, array.shape, array.dtype.descr if array.dtype.names else array.dtype.str)
+                for name, array in self.arrays_.items()}
+
+    def __getitem__(self, name):
+        return self.arrays_[name]
+
+    def close(self):
+        """ Essa função desfaz o mapeamento dos arrays e, no processo que os criou, libera a memória compartilhada.
+        """
+        self.arrays_ = {}
+
+        for block in self.blocks_.values():
+            block.close()
+
+            if self.owner_:
+                block.unlink()
+
+        self.blocks_ = {}
@@ -0,0 +1 @@
+from .SharedArrays import SharedArrays
\ No newline at end of file
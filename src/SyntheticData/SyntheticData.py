@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+class SyntheticData:
+    def __init__(self, nUsers=10000, nItems=2000, density=0.01, nGenres=20, targetsPerUser=10, seed=13):
+        """ Essa classe gera dados sintéticos de notas, conteúdo e targets no mesmo formato dos arquivos lidos pelo
+            main.py, para medir o desempenho dos recomendadores em escalas diferentes.
+
+        Attributes:
+        -----------
+            nUsers (int): Número de usuários
+
+            nItems (int): Número de itens do catálogo
+
+            density (float): Fração dos pares (usuário, item) que recebem uma nota
+
+            nGenres (int): Número de gêneros distintos do catálogo
+
+            targetsPerUser (int): Número de itens para predição de cada usuário
+
+            seed (int): Semente do gerador de números aleatórios
+
+        """
+        self.nUsers = nUsers
+        self.nItems = nItems
+        self.density = density
+        self.nGenres = nGenres
+        self.targetsPerUser = targetsPerUser
+        self.seed = seed
+
+    def _formatIds(self, prefix, indexes):
+        """ Essa função converte índices inteiros em ids de texto de tamanho fixo.
+        """
+        return np.char.add(prefix, np.char.zfill(indexes.astype(str), 8))
+
+    def _withMissing(self, values, missing):
+        """ Essa função substitui os valores marcados em missing pelo texto N/A, como nos dados reais.
+        """
+        return np.where(missing, 'N/A', values)
+
+    def generateRatings(self, random):
+        """ Essa função gera as notas, de 0 a 10, como a soma de uma média, de bias de usuários e itens e de um ruído.
+            Os pares (usuário, item) são únicos.
+        """
+        nRatings = int(self.density * self.nUsers * self.nItems)
+        pairs = np.unique(random.randint(0, self.nUsers, nRatings).astype(np.int64) * self.nItems + random.randint(0, self.nItems, nRatings))
+
+        users, items = pairs // self.nItems, pairs % self.nItems
+        userBias = random.normal(0, 1.5, self.nUsers)
+        itemBias = random.normal(0, 1.5, self.nItems)
+        ratings = np.clip(np.rint(6 + userBias[users] + itemBias[items] + random.normal(0, 1.5, len(pairs))), 0, 10)
+
+        order = random.permutation(len(pairs))
+
+        return pd.DataFrame({
+            'UserId': self._formatIds('u', users[order]),
+            'ItemId': self._formatIds('i', items[order]),
+            'Rating': ratings[order].astype(np.int64),
+            'Timestamp': random.randint(1300000000, 1600000000, len(pairs)),
+        })
+
+    def generateContent(self, random):
+        """ Essa função gera o catálogo com os campos de texto que o recomendador de conteúdo corrige: Genre, com de um
+            a três gêneros, Metascore, imdbRating, imdbVotes e BoxOffice, com separadores de milhar e valores N/A.
+        """
+        genres = np.array(['Genre' + str(genre) for genre in range(self.nGenres)])
+        genreLists = [', '.join(random.choice(genres, random.randint(1, 4), replace=False)) for item in range(self.nItems)]
+
+        return pd.DataFrame({
+            'ItemId': self._formatIds('i', np.arange(self.nItems)),
+            'Title': self._formatIds('Title', np.arange(self.nItems)),
+            'Genre': self._withMissing(genreLists, random.rand(self.nItems) < 0.02),
+            'Metascore': self._withMissing(random.randint(1, 101, self.nItems).astype(str), random.rand(self.nItems) < 0.2),
+            'imdbRating': self._withMissing(np.char.mod('%.1f', random.uniform(1, 10, self.nItems)), random.rand(self.nItems) < 0.1),
+            'imdbVotes': self._withMissing([format(votes, ',') for votes in random.randint(1, 10 ** 6, self.nItems)],
+                                           random.rand(self.nItems) < 0.1),
+            'BoxOffice': self._withMissing([format(value, ',') for value in random.randint(1, 10 ** 8, self.nItems)],
+                                           random.rand(self.nItems) < 0.3),
+        })
+
+    def generateTargets(self, random):
+        """ Essa função gera os pares (usuário, item) para predição, targetsPerUser itens por usuário.
+        """
+        users = np.repeat(np.arange(self.nUsers), self.targetsPerUser)
+        items = random.randint(0, self.nItems, len(users))
+
+        return pd.DataFrame({'UserId': self._formatIds('u', users), 'ItemId': self._formatIds('i', items)})
+
+    def write(self, directory):
+        """ Essa função gera os três conjuntos de dados e os grava no diretório como ratings.jsonl, content.jsonl e
+            targets.csv.
+
+        Returns:
+        -----------
+            paths (tuple): Caminhos dos arquivos de notas, conteúdo e targets
+
+        """
+        os.makedirs(directory, exist_ok=True)
+        random = np.random.RandomState(self.seed)
+
+        paths = tuple(os.path.join(directory, name) for name in ['ratings.jsonl', 'content.jsonl', 'targets.csv'])
+
+        self.generateRatings(random).to_json(paths[0], orient='records', lines=True)
+        self.generateContent(random).to_json(paths[1], orient='records', lines=True)
+        self.generateTargets(random).to_csv(paths[2], index=False)
+
+        return paths
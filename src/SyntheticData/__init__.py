@@ -0,0 +1 @@
+from .SyntheticData import SyntheticData
\ No newline at end of file